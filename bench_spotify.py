@@ -0,0 +1,302 @@
+"""
+Benchmarks for spotify_module.
+
+    python bench_spotify.py                  # run everything, compare with bench_baseline.json
+    python bench_spotify.py --save-baseline  # record the current numbers as the new baseline
+    python bench_spotify.py --check          # exit non-zero on a regression (for CI)
+
+The import-time check guards against regressions in the lazy import of spotify_module.
+The API benchmarks drive search_tracks, get_playlist_for_emotion_and_language and the
+bulk write paths against fake_spotify.FakeSpotifyServer at several concurrency levels,
+with configurable latency, jitter, error rate and 429 rate. The ranking benchmark
+scores a large synthetic candidate pool with mood_ranking.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from records import Track, Artist
+from spotify_cache import QueryCache
+
+
+def _fake_results(n, limit, as_records=True):
+    """Search results shaped like search_tracks output; as_records=False gives the old plain dicts"""
+    results = {
+        'tracks': [{
+            'name': f"Song {n}-{i}",
+            'artist': f"Artist {n % 50}",
+            'url': f"https://open.spotify.com/track/{n:011d}{i:011d}",
+            'uri': f"spotify:track:{n:011d}{i:011d}",
+            'preview_url': None
+        } for i in range(limit)],
+        'artists': [{
+            'name': f"Artist {n % 50}",
+            'url': f"https://open.spotify.com/artist/{n:022d}",
+            'uri': f"spotify:artist:{n:022d}"
+        } for _ in range(limit)]
+    }
+    if as_records:
+        results['tracks'] = [Track.from_dict(track) for track in results['tracks']]
+        results['artists'] = [Artist.from_dict(artist) for artist in results['artists']]
+    return results
+
+
+def bench_search_cache(entries=2000, limit=10, lookups=100_000, as_records=True):
+    """Measure search cache hit latency and memory per entry"""
+    cache = QueryCache(max_bytes=1024 ** 3)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for n in range(entries):
+        cache.set(f"query {n}", limit, _fake_results(n, limit, as_records))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    queries = [f"Query  {n % entries}" for n in range(lookups)]
+    start = time.perf_counter()
+    for query in queries:
+        cache.get(query, limit // 2)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "entries": entries,
+        "hit_latency_us": elapsed / lookups * 1e6,
+        "memory_per_entry_bytes": (after - before) / entries,
+        "estimated_bytes_per_entry": cache.bytes / entries,
+        "hit_rate": cache.stats["hits"] / lookups
+    }
+
+
+# Cold import of spotify_module should stay well below this (microseconds)
+import_budget_us = 50_000
+
+
+def bench_import_time(module="spotify_module", runs=5):
+    """Cold-import `module` in fresh interpreters with -X importtime; returns the best cumulative time"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    heaviest = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True, check=True
+        )
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative_us, name = line.split("|")
+            # Nested imports are indented under (and listed before) the module importing them
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            rows.append((int(cumulative_us), name.strip(), depth))
+        end = max(row for row, (_, name, depth) in enumerate(rows) if name == module and depth == 0)
+        start = end
+        while start > 0 and rows[start - 1][2] > 0:
+            start -= 1
+        total = rows[end][0]
+        if best is None or total < best:
+            best = total
+            # The module's own imports, not interpreter startup (site, encodings)
+            heaviest = sorted(((us, name) for us, name, _ in rows[start:end]), reverse=True)[:5]
+    return {"module": module, "cumulative_us": best, "budget_us": import_budget_us,
+            "within_budget": best <= import_budget_us, "heaviest_imports": heaviest}
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50_ms": pick(0.50) * 1000, "p95_ms": pick(0.95) * 1000, "p99_ms": pick(0.99) * 1000}
+
+
+def random_pool(size, seed=1, tags_per_track=3, languages=("english", "hindi", "tamil")):
+    """CandidateMatrix of `size` synthetic tracks with random attributes, tags and one language each"""
+    import numpy as np
+    from mood_ranking import ATTRIBUTES, TAGS, CandidateMatrix
+
+    rng = np.random.default_rng(seed)
+    features = np.zeros((size, len(ATTRIBUTES) + len(TAGS)), dtype=np.float32)
+    features[:, :len(ATTRIBUTES)] = rng.random((size, len(ATTRIBUTES)), dtype=np.float32) - 0.5
+    rows = np.repeat(np.arange(size), tags_per_track)
+    columns = len(ATTRIBUTES) + rng.integers(0, len(TAGS), size * tags_per_track)
+    features[rows, columns] = rng.random(size * tags_per_track, dtype=np.float32)
+    membership = np.zeros((size, len(languages)), dtype=bool)
+    membership[np.arange(size), rng.integers(0, len(languages), size)] = True
+    return CandidateMatrix(list(range(size)), features, membership,
+                           {language: column for column, language in enumerate(languages)})
+
+
+def bench_ranking(pool=100_000, limit=10, queries=50):
+    """Latency of ranking a `pool`-track candidate matrix for a mood and language"""
+    from moods import MOOD_MAPPING
+
+    matrix = random_pool(pool)
+    emotions = [mood["emotion"] for mood in MOOD_MAPPING.values()]
+    languages = list(matrix.language_columns)
+    samples = []
+    for n in range(queries):
+        start = time.perf_counter()
+        matrix.rank(emotions[n % len(emotions)], languages[n % len(languages)], limit)
+        samples.append(time.perf_counter() - start)
+    return {"pool": pool, "limit": limit, **_percentiles(samples)}
+
+
+def _api_scenarios(token_info):
+    """name -> op(n); each op hits the API (never a cache) and returns True on success"""
+    import spotify_module
+
+    def search(n):
+        return bool(spotify_module.search_tracks(f"bench search {n}", limit=10)["tracks"])
+
+    def playlists(n):
+        # A distinct genre per call gives a distinct cache key, so every call fetches
+        return bool(spotify_module.get_playlist_for_emotion_and_language("happy", "English", genre=f"bench{n}"))
+
+    def add_tracks(n):
+        playlist = spotify_module.create_playlist("bench-user", f"Bench {n}", "", token_info)
+        uris = [f"spotify:track:{n:011d}{i:011d}" for i in range(250)]
+        return bool(playlist) and spotify_module.add_tracks_to_playlist(playlist["id"], uris, token_info)["ok"]
+
+    def save_library(n):
+        uris = [f"spotify:track:{n:011d}{i:011d}" for i in range(120)]
+        return all(spotify_module.save_tracks_to_library(uris, token_info).values())
+
+    return {"search_tracks": search, "playlists": playlists, "add_tracks": add_tracks, "save_library": save_library}
+
+
+def bench_api(concurrency=(1, 4, 16), ops=48, latency=0.02, jitter=0.01, error_rate=0.0, throttle_rate=0.0,
+              retry_after=1, scenarios=None, seed=1):
+    """Throughput and tail latency of the main API paths against a local fake Spotify server"""
+    import spotify_module
+    from fake_spotify import FakeSpotifyServer
+    from spotify_scheduler import RequestScheduler
+
+    config = spotify_module.get_config()
+    saved = (spotify_module.scheduler, spotify_module.disk_cache, config["api_url"], config["token_url"])
+    results = {}
+    with FakeSpotifyServer(latency=latency, jitter=jitter, error_rate=error_rate,
+                           throttle_rate=throttle_rate, seed=seed) as server:
+        server.retry_after = retry_after
+        # Measure the client, not the client-side rate limit or the disk cache
+        spotify_module.scheduler = RequestScheduler(rate=100_000, burst=10_000, backoff=0.05)
+        spotify_module.disk_cache = None
+        config["api_url"], config["token_url"] = server.api_url, server.token_url
+        spotify_module.clear_spotify_clients()
+        token_info = {"access_token": "bench-token", "expires_at": int(time.time()) + 3600}
+        try:
+            for name, op in _api_scenarios(token_info).items():
+                if scenarios and name not in scenarios:
+                    continue
+                for workers in concurrency:
+                    spotify_module.search_cache.clear()
+                    spotify_module.playlist_cache.clear()
+                    spotify_module.saved_status_cache.clear()
+                    before = server.stats["api_requests"]
+                    offset = workers * ops
+
+                    def timed(n):
+                        start = time.perf_counter()
+                        ok = op(offset + n)
+                        return time.perf_counter() - start, ok
+
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(workers) as pool:
+                        samples = list(pool.map(timed, range(ops)))
+                    elapsed = time.perf_counter() - start
+                    results[f"{name}@{workers}"] = {
+                        "ops_per_sec": ops / elapsed,
+                        **_percentiles([seconds for seconds, _ in samples]),
+                        "failures": sum(not ok for _, ok in samples),
+                        "api_requests": server.stats["api_requests"] - before
+                    }
+        finally:
+            spotify_module.scheduler, spotify_module.disk_cache, config["api_url"], config["token_url"] = saved
+            spotify_module.clear_spotify_clients()
+    return results
+
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+# Allowed slowdown relative to the baseline before a result counts as a regression
+regression_tolerance = 0.25
+
+
+def compare_to_baseline(results, baseline, tolerance=regression_tolerance):
+    """List of human-readable regressions: lower throughput or higher p95 than the baseline allows"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if "ops_per_sec" in base and result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['ops_per_sec']:,.1f} ops/s vs baseline {base['ops_per_sec']:,.1f}")
+        if "p95_ms" in base and result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:,.1f} ms vs baseline {base['p95_ms']:,.1f}")
+    return regressions
+
+
+def load_baseline(path=baseline_path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(results, path=baseline_path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _print_result(title, result):
+    print(title)
+    for name, value in result.items():
+        if isinstance(value, float):
+            print(f"  {name}: {value:,.2f}")
+        elif isinstance(value, int) and not isinstance(value, bool):
+            print(f"  {name}: {value:,}")
+        else:
+            print(f"  {name}: {value}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark spotify_module")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated worker counts")
+    parser.add_argument("--ops", type=int, default=48, help="operations per scenario and concurrency level")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {baseline_path}")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    _print_result("Search cache:", bench_search_cache())
+    _print_result("Search cache (plain dicts, for comparison):", bench_search_cache(as_records=False))
+    import_time = bench_import_time()
+    _print_result("Import time:", import_time)
+    _print_result("Mood ranking:", bench_ranking())
+    api = bench_api(
+        concurrency=[int(n) for n in args.concurrency.split(",")], ops=args.ops, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate
+    )
+    for name, result in api.items():
+        _print_result(f"API {name}:", result)
+
+    if args.save_baseline:
+        save_baseline(api)
+        print(f"Baseline saved to {baseline_path}")
+    else:
+        regressions = compare_to_baseline(api, load_baseline())
+        if not import_time["within_budget"]:
+            regressions.append(f"import time: {import_time['module']} took {import_time['cumulative_us']} us, "
+                               f"budget {import_time['budget_us']} us")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if args.check and regressions:
+            sys.exit(1)
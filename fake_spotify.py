@@ -0,0 +1,336 @@
+"""
+Local stand-in for the Spotify Web API, used by the tests.
+
+Serves just enough of the accounts, search and playlist endpoints for spotify_module,
+counts TCP connections and token requests so connection reuse can be checked,
+and can answer requests with 429 + Retry-After to exercise rate-limit handling.
+Latency, jitter and random 503/429 rates make it usable for benchmarks too.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# Same digit order as Spotify (and records.BASE62), so fake IDs pack like real ones
+BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def fake_id(*parts):
+    """Stable 22-character base62 ID, shaped like a real Spotify ID"""
+    value = int.from_bytes(hashlib.md5(repr(parts).encode()).digest(), "big")
+    chars = []
+    for _ in range(22):
+        value, digit = divmod(value, 62)
+        chars.append(BASE62[digit])
+    return "".join(reversed(chars))
+
+
+def _fake_playlist(query, n):
+    playlist_id = fake_id("playlist", query, n)
+    return {
+        "id": playlist_id,
+        "name": f"{query.title()} #{n}",
+        "uri": f"spotify:playlist:{playlist_id}",
+        "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"},
+        "description": f"Fake playlist for '{query}'",
+        "images": [{"url": f"https://i.scdn.co/image/{playlist_id}"}]
+    }
+
+
+def _fake_track(query, n):
+    track_id = fake_id("track", query, n)
+    return {
+        "id": track_id,
+        "name": f"{query.title()} Song {n}",
+        "artists": [{"name": f"{query.title()} Artist"}],
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        "uri": f"spotify:track:{track_id}",
+        "preview_url": None
+    }
+
+
+def _fake_artist(query, n):
+    artist_id = fake_id("artist", query, n)
+    return {
+        "id": artist_id,
+        "name": f"{query.title()} Artist {n}",
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+        "uri": f"spotify:artist:{artist_id}"
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _begin_api_request(self):
+        """Count and delay an API request; returns False if it was answered with an error"""
+        server = self.server
+        server.count("api_requests")
+        with server.data_lock:
+            delay = server.latency + server.random.uniform(0, server.jitter)
+            fail = server.fail_next > 0 or server.random.random() < server.error_rate
+            if server.fail_next > 0:
+                server.fail_next -= 1
+            throttle = server.throttle_next > 0 or server.random.random() < server.throttle_rate
+            if server.throttle_next > 0:
+                server.throttle_next -= 1
+        time.sleep(delay)
+        if fail:
+            server.count("errors")
+            self._send_json(503, {"error": {"status": 503, "message": "Service unavailable"}})
+            return False
+        if throttle:
+            server.count("throttled")
+            data = json.dumps({"error": {"status": 429, "message": "API rate limit exceeded"}}).encode()
+            self.send_response(429)
+            self.send_header("Retry-After", str(server.retry_after))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return False
+        return True
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"status": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self._read_body()
+        if url.path == "/api/token":
+            self.server.count("token_requests")
+            self._send_json(200, {"access_token": "fake-app-token", "token_type": "Bearer", "expires_in": 3600})
+            return
+
+        if not self._begin_api_request():
+            return
+        server = self.server
+        if match := re.fullmatch(r"/v1/users/([^/]+)/playlists", url.path):
+            data = json.loads(body or b"{}")
+            playlist_id = fake_id("created", len(server.playlists), data.get("name"))
+            with server.data_lock:
+                server.playlists[playlist_id] = []
+            self._send_json(201, {
+                "id": playlist_id,
+                "name": data.get("name"),
+                "uri": f"spotify:playlist:{playlist_id}",
+                "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}
+            })
+        elif match := re.fullmatch(r"/v1/playlists/([^/]+)/(?:items|tracks)", url.path):
+            uris = json.loads(body or b"[]")
+            if isinstance(uris, dict):
+                uris, params = uris.get("uris", []), {**params, **uris}
+            if len(uris) > 100:
+                self._send_json(400, {"error": {"status": 400, "message": "You can add a maximum of 100 tracks per request."}})
+                return
+            with server.data_lock:
+                items = server.playlists.setdefault(match.group(1), [])
+                position = params.get("position")
+                position = len(items) if position in (None, "None") else int(position)
+                items[position:position] = uris
+            self._send_json(201, {"snapshot_id": fake_id("snapshot", match.group(1), len(items))})
+        else:
+            self._not_found()
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self._read_body()
+        if not self._begin_api_request():
+            return
+        if url.path == "/v1/me/library":
+            uris = params.get("uris", "").split(",")
+            if len(uris) > 50:
+                self._send_json(400, {"error": {"status": 400, "message": "Too many ids requested"}})
+                return
+            with self.server.data_lock:
+                self.server.library.update(uris)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if not self._begin_api_request():
+            return
+        if match := re.fullmatch(r"/v1/playlists/([^/]+)", url.path):
+            items = self.server.playlists.get(match.group(1))
+            if items is None:
+                self._not_found()
+                return
+            self._send_json(200, {"id": match.group(1), "tracks": {"total": len(items)}})
+        elif match := re.fullmatch(r"/v1/playlists/([^/]+)/(?:items|tracks)", url.path):
+            self._send_json(200, self._playlist_items(match.group(1), int(params.get("offset", 0)),
+                                                      int(params.get("limit", 100))))
+        elif url.path == "/v1/me/library/contains":
+            uris = params.get("uris", "").split(",")
+            if len(uris) > 50:
+                self._send_json(400, {"error": {"status": 400, "message": "Too many ids requested"}})
+                return
+            with self.server.data_lock:
+                self._send_json(200, [uri in self.server.library for uri in uris])
+        elif url.path.rstrip("/") == "/v1/me":
+            self._send_json(200, {"id": "fake-user", "display_name": "Fake User"})
+        elif url.path == "/v1/search":
+            query = params.get("q", "")
+            limit = int(params.get("limit", 10))
+            offset = int(params.get("offset", 0))
+            total = self.server.search_total
+            # Each revision of a query drops its first result and adds a new one at the end
+            shift = self.server.search_revisions.get(query, 0)
+            body = {}
+            for kind in params.get("type", "track").split(","):
+                make = {"playlist": self._playlist, "track": _fake_track, "artist": _fake_artist}[kind]
+                end = min(offset + limit, total)
+                next_url = None
+                if end < total:
+                    next_url = f"{self.server.api_url}search?q={query}&type={kind}&offset={end}&limit={limit}"
+                body[kind + "s"] = {
+                    "items": [make(query, n + shift) for n in range(offset, end)],
+                    "offset": offset, "limit": limit, "total": total, "next": next_url
+                }
+            self._send_json(200, body)
+        else:
+            self._not_found()
+
+    def _playlist(self, query, n):
+        playlist = _fake_playlist(query, n)
+        revision = self.server.playlist_revisions.get(playlist["id"], 0)
+        playlist["snapshot_id"] = fake_id("snapshot", playlist["id"], revision)
+        return playlist
+
+    def _playlist_items(self, playlist_id, offset, limit):
+        """A page of a playlist's items: the ones added to created playlists, generated ones otherwise"""
+        server = self.server
+        with server.data_lock:
+            uris = server.playlists.get(playlist_id)
+            revision = server.playlist_revisions.get(playlist_id, 0)
+        if uris is not None:
+            tracks = [{"uri": uri, "name": uri, "artists": [{"name": "Unknown"}]} for uri in uris]
+        else:
+            # Like searches, each revision drops the first track and adds one at the end
+            tracks = [_fake_track(f"playlist {playlist_id}", n + revision) for n in range(server.playlist_length)]
+        page = tracks[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(tracks):
+            next_url = f"{server.api_url}playlists/{playlist_id}/items?offset={offset + limit}&limit={limit}"
+        return {"items": [{"item": track} for track in page], "offset": offset, "limit": limit,
+                "total": len(tracks), "next": next_url}
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """Threaded fake Spotify server; use as a context manager"""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, seed=None):
+        super().__init__((host, port), _Handler)
+        # Seconds each API response is delayed (plus up to `jitter` more), to simulate network round-trips
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of API requests answered with 503 Service Unavailable / 429 Too Many Requests
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.stats = {"connections": 0, "token_requests": 0, "api_requests": 0, "throttled": 0, "errors": 0}
+        # Answer the next N API requests with 429 Too Many Requests and this Retry-After
+        self.throttle_next = 0
+        # Answer the next N API requests with 503 Service Unavailable
+        self.fail_next = 0
+        self.retry_after = 1
+        self._stats_lock = threading.Lock()
+        # Playlists created or written to: playlist id -> list of item URIs
+        self.playlists = {}
+        # Results every search has in total, served a page at a time via offset/limit
+        self.search_total = 100
+        # Bump to change a query's results (query -> revision) or a searched playlist's
+        # snapshot_id and items (playlist id -> revision)
+        self.search_revisions = {}
+        self.playlist_revisions = {}
+        # Items in each playlist found by search
+        self.playlist_length = 10
+        # URIs saved to the (single) fake user's library
+        self.library = set()
+        self.data_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.base_url + "/v1/"
+
+    @property
+    def token_url(self):
+        return self.base_url + "/api/token"
+
+    def count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Spotify Web API locally")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds, uniformly")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of API requests answered with 429")
+    args = parser.parse_args()
+
+    with FakeSpotifyServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate) as server:
+        print(f"Fake Spotify API on {server.api_url} (token endpoint {server.token_url})")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,406 @@
+"""
+Incremental refresh of the mood index and the playlist recommendation caches.
+
+Instead of rebuilding from scratch, each cycle refetches only what is due and applies
+the differences in place:
+
+  - every harvest query (genre tag x language, see mood_index) and every playlist
+    recommendation query (emotion x language) has its own freshness; a cycle refetches
+    the stalest ones older than INDEX_REFRESH_QUERY_TTL,
+  - a harvest query whose results changed moves tag weights for just the tracks that
+    entered, left or changed rank,
+  - a recommendation query whose playlists changed is written to the playlist caches
+    (memory and disk) in place; unchanged ones cost no writes,
+  - search results carry each playlist's snapshot_id, so a playlist's items are only
+    refetched when its snapshot changed. Items of playlists whose name or description
+    match emotion_genres tags feed the mood index under those tags.
+
+Every track's weight for a tag is the best one any current source (harvest query or
+playlist) gives it, so a track that drops out of one source keeps what others give it
+and leaves the index once nothing does. A cycle applies its changes to a copy of the
+index and swaps it in at the end, with its ranking matrix already built, so users'
+queries never wait for a rebuild. Cycles run at background priority and stop starting
+new work once they have spent their request budget; what's left is first in line
+next cycle. Progress is kept in INDEX_REFRESH_STATE, so restarts resume where
+they left off.
+
+Only one process refreshes at a time: cycles run under an exclusive lock on
+INDEX_REFRESH_STATE + ".lock", which the first process to take it keeps. With
+EMOTUNES_REFRESH=1 every Streamlit worker starts the loop, but the others only retry
+the lock each interval, without loading the index or state, and take over if the
+holder exits. The holder reloads the state each cycle (and the index file on taking
+over), so it continues from what was last saved.
+
+    python index_refresh.py                     # one cycle
+    python index_refresh.py --every 900         # a cycle every 15 minutes
+    EMOTUNES_REFRESH=1 streamlit run app.py
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lease, so run a single refreshing process
+    fcntl = None
+
+import mood_index
+import shared_index
+import similarity
+import spotify_module
+from mood_ranking import TAGS
+from records import pack_uri
+from spotify_scheduler import background, counting
+
+state_path = os.getenv("INDEX_REFRESH_STATE", ".emotunes_refresh.json")
+# Seconds before a query is due for a refetch
+query_ttl = float(os.getenv("INDEX_REFRESH_QUERY_TTL", "86400"))
+# Upstream requests a cycle may spend, and seconds between cycles
+default_budget = int(os.getenv("INDEX_REFRESH_BUDGET", "100"))
+default_interval = float(os.getenv("INDEX_REFRESH_INTERVAL", "900"))
+# Tracks per harvest query, and per playlist (one page)
+harvest_limit = int(os.getenv("INDEX_REFRESH_PER_TAG", "20"))
+playlist_track_limit = 100
+# Tag weight of a track for being in a playlist that matches the tag
+playlist_tag_weight = 0.5
+
+_tag_patterns = {tag: re.compile(rf"(?<!\w){re.escape(tag)}(?!\w)") for tag in TAGS}
+
+
+def playlist_tags(playlist):
+    """emotion_genres tags mentioned in a playlist's name or description"""
+    text = f"{playlist.name} {playlist.description or ''}".lower()
+    return [tag for tag, pattern in _tag_patterns.items() if pattern.search(text)]
+
+
+class RefreshPipeline:
+    """Incremental refresh state and logic for one MoodIndex"""
+
+    def __init__(self, index=None, state_file=None, index_file=None, emotions=None, languages=None,
+                 clock=time.time):
+        self._index = index
+        self.state_file = state_file if state_file is not None else state_path
+        self.index_file = index_file if index_file is not None else mood_index.index_path
+        self.emotions = emotions or list(spotify_module.emotion_genres)
+        self.languages = languages or list(spotify_module.language_queries)
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Copy of the index a running cycle applies its changes to
+        self._draft = None
+        # Open lock file while this pipeline holds the refresh lease
+        self._lease = None
+        self.state = None
+
+    @property
+    def index(self):
+        """The MoodIndex being refreshed, the process-wide one by default (only loaded once refreshing)"""
+        if self._index is None:
+            self._index = mood_index.get_index()
+        return self._index
+
+    def _take_lease(self):
+        """Hold the cross-process refresh lease, taking it if it's free; True if held"""
+        if self._lease is not None:
+            return True
+        lock_path = f"{self.state_file or state_path}.lock"
+        try:
+            lease = open(lock_path, "a")
+        except OSError as e:
+            print(f"Error opening refresh lock {lock_path}: {e}")
+            return False
+        if fcntl is not None:
+            try:
+                fcntl.flock(lease.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lease.close()
+                return False
+        self._lease = lease
+        # The previous holder may have refreshed the index since this process loaded it
+        if self._index is None and mood_index._index is None:
+            self._index = mood_index.get_index()
+        elif self.index_file and os.path.exists(self.index_file):
+            latest = mood_index.MoodIndex()
+            latest.load(self.index_file)
+            self.index.replace(latest)
+        return True
+
+    def close(self):
+        """Release the refresh lease, if held"""
+        if self._lease is not None:
+            self._lease.close()
+            self._lease = None
+
+    # State: {"queries": {id: {"refreshed_at", "fingerprint"}},
+    #         "sources": {id: {"tags", "language", "weights": {uri: weight}, ...}},
+    #         "pending": {playlist uri: snapshot_id}}
+
+    def _load_state(self):
+        self.state = {"version": 1, "queries": {}, "sources": {}, "pending": {}}
+        if self.state_file and os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, encoding="utf-8") as f:
+                    self.state.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Error loading refresh state from {self.state_file}: {e}")
+        # Which sources currently contribute each track
+        self._sources_by_track = {}
+        for source_id, source in self.state["sources"].items():
+            for uri in source["weights"]:
+                self._sources_by_track.setdefault(uri, set()).add(source_id)
+
+    def save_state(self):
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"Error saving refresh state to {self.state_file}: {e}")
+
+    # Work selection
+
+    def queries(self):
+        """Every query the pipeline keeps fresh, as (query ID, kind, args)"""
+        tags = dict.fromkeys(tag for emotion in self.emotions for tag in spotify_module.emotion_genres[emotion])
+        harvest = [(f"harvest|{tag}|{language}", "harvest", (tag, language))
+                   for language in self.languages for tag in tags]
+        playlists = [(f"playlists|{emotion}|{language}", "playlists", (emotion, language))
+                     for emotion in self.emotions for language in self.languages]
+        return playlists + harvest
+
+    def due(self, now=None):
+        """Queries older than query_ttl (never fetched first), stalest first"""
+        now = self.clock() if now is None else now
+        refreshed = {query_id: entry["refreshed_at"] for query_id, entry in self.state["queries"].items()}
+        due = [query for query in self.queries()
+               if query[0] not in refreshed or now - refreshed[query[0]] >= query_ttl]
+        return sorted(due, key=lambda query: refreshed.get(query[0], float("-inf")))
+
+    # Applying deltas
+
+    def _apply_source(self, source_id, tags, language, weights, tracks):
+        """
+        Replace one source's {uri: weight} and update tag weights for the tracks whose
+        contribution changed. Returns True if anything changed.
+        """
+        source = self.state["sources"].get(source_id)
+        old = source["weights"] if source else {}
+        if old == weights:
+            return False
+        if weights or (source and "snapshot_id" in source):
+            source = self.state["sources"].setdefault(source_id, {"tags": tags, "language": language})
+            source["weights"] = weights
+        else:
+            self.state["sources"].pop(source_id, None)
+        changed = [uri for uri in old.keys() | weights.keys() if old.get(uri) != weights.get(uri)]
+        for uri in changed:
+            contributors = self._sources_by_track.setdefault(uri, set())
+            if uri in weights:
+                contributors.add(source_id)
+            else:
+                contributors.discard(source_id)
+            self._reconcile(uri, tags, tracks.get(uri), language)
+            if not contributors:
+                del self._sources_by_track[uri]
+        return bool(changed)
+
+    def _reconcile(self, uri, tags, track, language):
+        """Set a track's weight for `tags` to the best any current source gives it"""
+        sources = [self.state["sources"][source_id] for source_id in self._sources_by_track.get(uri, ())]
+        track = track or self._draft.tracks.get(pack_uri(uri))
+        for tag in tags:
+            weight = max((source["weights"][uri] for source in sources if tag in source["tags"]), default=0.0)
+            if track is not None:
+                self._draft.set_tag(track, tag, weight, [language])
+
+    # Jobs
+
+    def _refresh_harvest(self, query_id, tag, language, sp):
+        results = sp.search(q=mood_index.harvest_query(tag, language), type="track", limit=harvest_limit)
+        items = [item for item in ((results or {}).get("tracks") or {}).get("items") or [] if item and "uri" in item]
+        tracks = {item["uri"]: spotify_module._track_summary(item) for item in items}
+        # As in MoodIndex.harvest, a track's weight falls with its rank
+        weights = {uri: 1.0 - rank / harvest_limit for rank, uri in enumerate(tracks)}
+        self.state["queries"][query_id] = {"refreshed_at": self.clock()}
+        return self._apply_source(query_id, [tag], language, weights, tracks)
+
+    def _refresh_playlists(self, query_id, emotion, language):
+        key = spotify_module._playlist_cache_key(emotion, language)
+        playlists = spotify_module._fetch_playlists_for_emotion_and_language(emotion, language)
+        if not playlists:
+            # Errors and empty responses leave the caches as they were; retried next cycle
+            return None
+        entry = self.state["queries"].get(query_id, {})
+        fingerprint = [[playlist.uri, playlist.snapshot_id] for playlist in playlists]
+        changed = fingerprint != entry.get("fingerprint")
+        if changed:
+            spotify_module._store_playlists(key, playlists)
+
+        current = set()
+        for playlist in playlists:
+            tags = playlist_tags(playlist)
+            if not tags:
+                continue
+            source_id = f"playlist|{playlist.uri}"
+            current.add(source_id)
+            source = self.state["sources"].setdefault(
+                source_id, {"tags": tags, "language": language, "weights": {}, "snapshot_id": None, "queries": []}
+            )
+            if query_id not in source["queries"]:
+                source["queries"].append(query_id)
+            if source["snapshot_id"] != playlist.snapshot_id:
+                self.state["pending"][playlist.uri] = playlist.snapshot_id
+        # Playlists no longer recommended anywhere stop contributing tracks
+        for uri, _ in entry.get("fingerprint", []):
+            source_id = f"playlist|{uri}"
+            source = self.state["sources"].get(source_id)
+            if source_id in current or source is None:
+                continue
+            if query_id in source["queries"]:
+                source["queries"].remove(query_id)
+            if not source["queries"]:
+                self.state["pending"].pop(uri, None)
+                self._apply_source(source_id, source["tags"], source["language"], {}, {})
+                self.state["sources"].pop(source_id, None)
+                changed = True
+        self.state["queries"][query_id] = {"refreshed_at": self.clock(), "fingerprint": fingerprint}
+        return changed
+
+    def _refresh_playlist_items(self, uri, sp):
+        source = self.state["sources"].get(f"playlist|{uri}")
+        if source is None:
+            self.state["pending"].pop(uri, None)
+            return False
+        page = sp.playlist_items(uri, limit=playlist_track_limit)
+        tracks = {}
+        for entry in (page or {}).get("items") or []:
+            # Newer API versions name the entry's track "item"
+            item = (entry or {}).get("item") or (entry or {}).get("track")
+            if item and item.get("uri", "").startswith("spotify:track:"):
+                tracks.setdefault(item["uri"], spotify_module._track_summary(item))
+        source["snapshot_id"] = self.state["pending"].pop(uri, None)
+        weights = dict.fromkeys(tracks, playlist_tag_weight)
+        return self._apply_source(f"playlist|{uri}", source["tags"], source["language"], weights, tracks)
+
+    # Cycles
+
+    def run_cycle(self, budget=default_budget, stop_event=None):
+        """
+        Refresh changed playlists and due queries until `budget` requests are spent.
+        Returns {"queries", "playlists", "changed", "requests", "deferred"}, or None if
+        another process holds the refresh lease.
+        """
+        summary = {"queries": 0, "playlists": 0, "changed": 0, "requests": 0, "deferred": 0}
+        # Only the cycle's own requests count against the budget, not users' calls meanwhile
+        with self._lock, background(), counting() as requests:
+            if not self._take_lease():
+                return None
+            self._load_state()
+            # Playlists whose snapshot changed go first, including ones found during this cycle
+            jobs = deque(("items", (uri,)) for uri in self.state["pending"])
+            jobs.extend((kind, (query_id, *args)) for query_id, kind, args in self.due())
+            queued = set(self.state["pending"])
+            if not jobs:
+                return summary
+            self._draft = self.index.copy()
+            sp = spotify_module.get_spotify_client()
+            while jobs:
+                if summary["requests"] >= budget or (stop_event is not None and stop_event.is_set()):
+                    summary["deferred"] = len(jobs)
+                    break
+                kind, args = jobs.popleft()
+                try:
+                    if kind == "items":
+                        changed = self._refresh_playlist_items(*args, sp)
+                        summary["playlists"] += 1
+                    elif kind == "harvest":
+                        changed = self._refresh_harvest(*args, sp)
+                        summary["queries"] += 1
+                    else:
+                        changed = self._refresh_playlists(*args)
+                        summary["queries"] += 1
+                        jobs.extendleft(("items", (uri,)) for uri in self.state["pending"] if uri not in queued)
+                        queued.update(self.state["pending"])
+                except Exception as e:
+                    # Not marked fresh, so it's retried next cycle
+                    print(f"Error refreshing {args[0]}: {e}")
+                    changed = False
+                summary["requests"] = requests["calls"]
+                summary["changed"] += bool(changed)
+
+            if summary["changed"]:
+                self.index.replace(self._draft)
+                self._publish()
+            self._draft = None
+            self.save_state()
+        return summary
+
+    def _publish(self):
+        """Make index changes visible: save it, and rebuild the shared plane or extend the similarity index"""
+        if self.index_file:
+            self.index.save(self.index_file)
+        if spotify_module.shared_index_path and os.path.exists(spotify_module.shared_index_path):
+            shared_index.build_plane(source=self.index)
+        else:
+            # New tracks only; removed ones leave the similarity index on its next rebuild
+            similarity.get_index().sync(self.index)
+
+
+def run_forever(interval=default_interval, budget=default_budget, stop_event=None):
+    """Run a refresh cycle every `interval` seconds"""
+    stop_event = stop_event or threading.Event()
+    pipeline = RefreshPipeline()
+    try:
+        while not stop_event.is_set():
+            summary = pipeline.run_cycle(budget, stop_event)
+            if summary is not None:
+                print(f"Index refresh: {summary['queries']} queries and {summary['playlists']} playlists "
+                      f"({summary['changed']} changed) with {summary['requests']} requests, "
+                      f"{summary['deferred']} deferred")
+            stop_event.wait(interval)
+    finally:
+        pipeline.close()
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def start_background_refresh(interval=default_interval, budget=default_budget):
+    """Start the refresh loop in a daemon thread, once per process"""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=run_forever, args=(interval, budget), name="emotunes-index-refresh", daemon=True
+            )
+            _thread.start()
+    return _thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally refresh the EmoTunes mood index and playlist caches")
+    parser.add_argument("--budget", type=int, default=default_budget,
+                        help="upstream requests per cycle (default: %(default)s)")
+    parser.add_argument("--every", type=float, metavar="SECONDS", help="keep running, a cycle every SECONDS")
+    args = parser.parse_args(argv)
+
+    if args.every:
+        run_forever(args.every, args.budget)
+    else:
+        summary = RefreshPipeline().run_cycle(args.budget)
+        if summary is None:
+            print("Another process is refreshing the index; try again later")
+            return
+        print(f"Refreshed {summary['queries']} queries and {summary['playlists']} playlists "
+              f"({summary['changed']} changed) with {summary['requests']} requests, {summary['deferred']} deferred")
+
+
+if __name__ == "__main__":
+    main()
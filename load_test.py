@@ -0,0 +1,201 @@
+"""
+Headless load test for app.py.
+
+    python load_test.py --sessions 48 --concurrency 8
+
+Runs many simulated Streamlit sessions against fake_spotify.FakeSpotifyServer using
+Streamlit's AppTest harness. AppTest swaps a process-wide Runtime singleton on every
+run, so concurrent sessions run in worker processes rather than threads; each worker
+has its own caches and client pool, like one Streamlit replica would. Each session
+follows a scripted journey:
+open the app, pick a mood, change the language, search, load more results, save them,
+ask for recommendations and create a playlist. The report covers sessions/sec, the
+rerun latency distribution (overall and per step) and the memory a live session holds,
+which is what the worker count has to be sized against.
+"""
+import gc
+import multiprocessing
+import os
+import random
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from fake_spotify import FakeSpotifyServer
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+moods = ["energetic", "romantic", "heartbroken", "party", "angry"]
+languages = ["🇺🇸 English", "🇮🇳 Hindi", "🇮🇳 Kannada", "🇮🇳 Telugu", "🇮🇳 Tamil"]
+search_terms = ["daft punk", "arijit singh", "lofi beats", "taylor swift", "ilaiyaraaja", "metallica"]
+
+
+def _point_at(server):
+    """Send the app's Spotify traffic to the fake server; workers inherit the environment"""
+    os.environ.setdefault("SPOTIPY_CLIENT_ID", "load-test")
+    os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "load-test")
+    os.environ.setdefault("SPOTIPY_REDIRECT_URI", "http://localhost:8501/")
+    os.environ["SPOTIFY_API_URL"] = server.api_url
+    os.environ["SPOTIFY_TOKEN_URL"] = server.token_url
+    # Keep the real on-disk cache out of it, so every run starts cold
+    os.environ["EMOTUNES_CACHE_DB"] = ""
+    # Streamlit warns on every bare-mode run; keep that out of the report
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+
+def _init_worker():
+    # Compile the app and warm imports before the clock starts
+    run_journey(-1)
+
+
+def _timed_journey(seed):
+    """Picklable result of one journey for the worker pool"""
+    _, timings, error = run_journey(seed)
+    return timings, None if error is None else f"{type(error).__name__}: {error}"
+
+
+def _button(widgets, label):
+    return next(button for button in widgets if button.label.startswith(label))
+
+
+def run_journey(seed, timeout=30):
+    """One simulated user; returns (AppTest, [(step, seconds)], error or None)"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    timings = []
+
+    def step(name, action):
+        start = time.perf_counter()
+        action()
+        timings.append((name, time.perf_counter() - start))
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+
+    try:
+        step("load", at.run)
+        step("mood", lambda: at.button(key=rng.choice(moods)).click().run())
+        step("language", lambda: at.selectbox(key="language_selector").select(rng.choice(languages)).run())
+        # Log in by handing the session a user token, as the OAuth callback would
+        at.session_state["spotify_auth"] = True
+        at.session_state["token_info"] = {"access_token": f"load-test-{seed}", "expires_at": int(time.time()) + 3600}
+        step("search_input", lambda: at.text_input(key="main_search").input(f"{rng.choice(search_terms)} {seed}").run())
+        step("search", lambda: at.button(key="search_button").click().run())
+        step("load_more", lambda: at.button(key="load_more_results").click().run())
+        step("save", lambda: at.button(key="save_all_results").click().run())
+        step("recommend", lambda: _button(at.button, "🎵 Get Music Recommendations").click().run())
+        step("create_playlist", lambda: _button(at.sidebar.button, "Create Playlist").click().run())
+        if not at.sidebar.success:
+            failure = at.sidebar.error[0].value if at.sidebar.error else "no confirmation shown"
+            raise RuntimeError(f"create_playlist: {failure}")
+        return at, timings, None
+    except Exception as e:
+        return at, timings, e
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50_ms": pick(0.50) * 1000, "p95_ms": pick(0.95) * 1000, "p99_ms": pick(0.99) * 1000}
+
+
+def measure_session_memory(samples=5):
+    """Memory a finished session keeps alive (its AppTest tree and session state), in this process.
+
+    Median of per-session deltas, so one-off allocations made while a session
+    happens to run (lazy imports, metadata scans) don't get billed to it.
+    """
+    import spotify_module
+
+    # Start from the same cold caches the workers had, with imports already paid for
+    spotify_module.get_config.cache_clear()
+    spotify_module.clear_spotify_clients()
+    for cache in (spotify_module.search_cache, spotify_module.playlist_cache, spotify_module.saved_status_cache):
+        cache.clear()
+    run_journey(-1)
+    sessions, deltas = [], []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for n in range(samples):
+            before = tracemalloc.get_traced_memory()[0]
+            sessions.append(run_journey(10_000 + n)[0])
+            gc.collect()
+            deltas.append(tracemalloc.get_traced_memory()[0] - before)
+    finally:
+        tracemalloc.stop()
+    del sessions
+    return sorted(deltas)[len(deltas) // 2]
+
+
+def load_test(sessions=48, concurrency=8, latency=0.02, jitter=0.01, error_rate=0.0, memory_samples=5):
+    """Run `sessions` journeys, `concurrency` at a time, and summarize throughput, latency and memory"""
+    with FakeSpotifyServer(latency=latency, jitter=jitter, error_rate=error_rate) as server:
+        _point_at(server)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(concurrency, mp_context=context, initializer=_init_worker) as pool:
+            # Bring every worker up (and through its warm-up journey) before timing
+            list(pool.map(time.sleep, [0.1] * concurrency))
+            warmup_requests = server.stats["api_requests"]
+            start = time.perf_counter()
+            results = list(pool.map(_timed_journey, range(sessions)))
+            elapsed = time.perf_counter() - start
+
+        per_step = {}
+        for timings, _ in results:
+            for name, seconds in timings:
+                per_step.setdefault(name, []).append(seconds)
+        errors = [error for _, error in results if error]
+
+        report = {
+            "sessions": sessions,
+            "concurrency": concurrency,
+            "sessions_per_sec": sessions / elapsed,
+            "reruns": sum(len(samples) for samples in per_step.values()),
+            "rerun": _percentiles([s for samples in per_step.values() for s in samples]),
+            "steps": {name: _percentiles(samples) for name, samples in per_step.items()},
+            "failed_sessions": len(errors),
+            "errors": errors[:5],
+            "api_requests": server.stats["api_requests"] - warmup_requests
+        }
+        if memory_samples:
+            report["memory_per_session_bytes"] = measure_session_memory(memory_samples)
+    return report
+
+
+def _print_report(report):
+    print(f"Sessions: {report['sessions']} at concurrency {report['concurrency']}")
+    print(f"  sessions/sec: {report['sessions_per_sec']:,.2f}")
+    print(f"  reruns: {report['reruns']:,}  failed sessions: {report['failed_sessions']}")
+    print("  rerun latency: " + ", ".join(f"{k} {v:,.1f}" for k, v in report["rerun"].items()))
+    for name, stats in report["steps"].items():
+        print(f"    {name:<16}" + ", ".join(f"{k} {v:,.1f}" for k, v in stats.items()))
+    if "memory_per_session_bytes" in report:
+        print(f"  memory per session: {report['memory_per_session_bytes'] / 1024:,.1f} KiB")
+    print(f"  Spotify API requests: {report['api_requests']:,}")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate concurrent EmoTunes sessions against a fake Spotify API")
+    parser.add_argument("--sessions", type=int, default=48)
+    parser.add_argument("--concurrency", default="8", help="comma-separated levels, e.g. 1,4,16")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--memory-samples", type=int, default=5)
+    args = parser.parse_args()
+
+    # Run through the importable module so worker processes can unpickle its functions
+    # (AppTest executes app.py as __main__ inside each worker)
+    import load_test as harness
+
+    for level in [int(n) for n in args.concurrency.split(",")]:
+        harness._print_report(harness.load_test(args.sessions, level, args.latency, args.jitter, args.error_rate,
+                                args.memory_samples))
@@ -0,0 +1,322 @@
+"""
+Local mood-aware track index for offline recommendations.
+
+Tracks are harvested by searching Spotify for every genre tag in
+spotify_module.emotion_genres, in every language, and kept in memory with, per
+track, its languages and a feature vector: the weight of each tag it was found under
+(falling with its rank in that search) and any known audio attributes.
+
+"Tracks for emotion X in language Y" is scored over all tracks in language Y at once
+by mood_ranking, in-process and in milliseconds. The API is only used to refresh the
+index, never on a user's click:
+
+    python mood_index.py harvest --per-tag 20          # (re)build from Spotify
+    python mood_index.py import tracks.csv             # merge in a CSV or JSON export
+    python mood_index.py query energetic Hindi         # try it out
+
+The index is saved to MOOD_INDEX_PATH (mood_index.json by default). CSV files have
+the columns uri, name, artist, languages and tags, and optionally the audio attributes
+in mood_ranking.ATTRIBUTES; languages and tags are "|"-separated, and a tag may carry
+a weight as "tag:0.8".
+"""
+import csv
+import json
+import os
+import threading
+
+import shared_index
+import spotify_module
+from mood_ranking import ATTRIBUTES, CandidateMatrix
+from records import Track
+from spotify_scheduler import background
+
+index_path = os.getenv("MOOD_INDEX_PATH", "mood_index.json")
+
+EMOTIONS = list(spotify_module.emotion_genres)
+
+csv_fields = ["uri", "name", "artist", "preview_url", "languages", "tags", *ATTRIBUTES]
+
+
+def _normalize(value):
+    return value.strip().lower()
+
+
+class MoodIndex:
+    """Tracks with their tags, languages and attributes, and a feature matrix for ranking"""
+
+    def __init__(self):
+        self.tracks = {}        # packed ID -> Track
+        self.tags = {}          # packed ID -> {tag: weight in (0, 1]}
+        self.attributes = {}    # packed ID -> {attribute: value}, for tracks where they're known
+        self.languages = {}     # packed ID -> set of languages
+        self._matrix = None     # CandidateMatrix over every track, rebuilt after changes
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def add(self, track, tags, languages=(), attributes=None):
+        """
+        Index a Track under {tag: weight}, a list of tags (weight 1) or a CSV-style
+        "tag:weight|tag" string, its languages and optionally its audio attributes;
+        merges with what's already indexed.
+        """
+        tags = _parse_tags(tags)
+        if isinstance(languages, str):
+            languages = languages.split("|")
+        packed = track.packed_id
+        with self._lock:
+            self.tracks[packed] = track
+            self._matrix = None
+            track_tags = self.tags.setdefault(packed, {})
+            for tag, weight in tags.items():
+                tag = _normalize(tag)
+                # A track found under the same tag more than once keeps its best rank
+                track_tags[tag] = max(track_tags.get(tag, 0.0), float(weight))
+            self.languages.setdefault(packed, set()).update(filter(None, map(_normalize, languages)))
+            if attributes:
+                self.attributes[packed] = {**self.attributes.get(packed, {}), **attributes}
+
+    def set_tag(self, track, tag, weight, languages=()):
+        """
+        Set a Track's weight for one tag outright (add() keeps the best weight seen instead).
+        A weight of 0 removes the tag, and a track left without tags leaves the index.
+        """
+        if weight <= 0:
+            self.discard_tag(track.packed_id, tag)
+            return
+        self.add(track, {}, languages)
+        tag = _normalize(tag)
+        with self._lock:
+            self.tags[track.packed_id][tag] = float(weight)
+            self._matrix = None
+
+    def discard_tag(self, packed, tag):
+        tag = _normalize(tag)
+        with self._lock:
+            track_tags = self.tags.get(packed)
+            if track_tags is None or tag not in track_tags:
+                return
+            del track_tags[tag]
+            if not track_tags:
+                del self.tracks[packed], self.tags[packed], self.languages[packed]
+                self.attributes.pop(packed, None)
+            self._matrix = None
+
+    def copy(self):
+        """An independent copy, e.g. to apply a batch of changes to before swapping it in with replace()"""
+        other = MoodIndex()
+        with self._lock:
+            other.tracks = dict(self.tracks)
+            other.tags = {packed: dict(tags) for packed, tags in self.tags.items()}
+            other.attributes = {packed: dict(attributes) for packed, attributes in self.attributes.items()}
+            other.languages = {packed: set(languages) for packed, languages in self.languages.items()}
+            other._matrix = self._matrix
+        return other
+
+    def replace(self, other):
+        """
+        Take over another index's contents in one step. Its ranking matrix is built first,
+        by the caller, so queries never pay for the rebuild.
+        """
+        matrix = other.matrix()
+        with other._lock, self._lock:
+            self.tracks, self.tags = other.tracks, other.tags
+            self.attributes, self.languages = other.attributes, other.languages
+            self._matrix = matrix
+
+    def matrix(self):
+        """
+        The CandidateMatrix over every indexed track, in insertion order. Its keys are the
+        Track records themselves, so it stays usable after the index changes.
+        """
+        with self._lock:
+            if self._matrix is None:
+                packed_ids = list(self.tracks)
+                self._matrix = CandidateMatrix.build(
+                    [self.tracks[packed] for packed in packed_ids],
+                    [self.tags[packed] for packed in packed_ids],
+                    [self.attributes.get(packed) for packed in packed_ids],
+                    [self.languages[packed] for packed in packed_ids]
+                )
+            return self._matrix
+
+    def tracks_for(self, emotion, language=None, limit=10):
+        """
+        Top `limit` tracks for an emotion, best first, only ones in `language` if given;
+        tracks that don't fit the emotion at all are never returned.
+        """
+        return self.matrix().rank(_normalize(emotion), _normalize(language) if language else None, limit)
+
+    # Persistence
+
+    def _rows(self):
+        with self._lock:
+            return [
+                {
+                    **track.to_dict(),
+                    "languages": sorted(self.languages[packed]),
+                    "tags": dict(self.tags[packed]),
+                    **({"attributes": dict(self.attributes[packed])} if packed in self.attributes else {})
+                }
+                for packed, track in self.tracks.items()
+            ]
+
+    def _add_row(self, row):
+        track = Track.from_dict({
+            "name": row["name"],
+            "artist": row["artist"],
+            "uri": row["uri"],
+            "url": row.get("url"),
+            "preview_url": row.get("preview_url") or None
+        })
+        # CSV rows carry attributes as columns, JSON rows as a nested object
+        attributes = row.get("attributes") or {name: float(row[name]) for name in ATTRIBUTES if row.get(name)}
+        self.add(track, row.get("tags") or {}, row.get("languages") or (), attributes)
+
+    def save(self, path=None):
+        """Write the index to `path` (JSON, or CSV for .csv), atomically"""
+        path = path or index_path
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        rows = self._rows()
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                if path.endswith(".csv"):
+                    writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction="ignore")
+                    writer.writeheader()
+                    for row in rows:
+                        writer.writerow({
+                            **row,
+                            "languages": "|".join(row["languages"]),
+                            "tags": "|".join(f"{tag}:{weight:g}" for tag, weight in row["tags"].items()),
+                            **row.get("attributes", {})
+                        })
+                else:
+                    json.dump({"version": 1, "tracks": rows}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error saving mood index to {path}: {e}")
+
+    def load(self, path=None):
+        """Merge tracks from a JSON or CSV file into the index; returns how many were read"""
+        path = path or index_path
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f)) if path.endswith(".csv") else json.load(f).get("tracks", [])
+        except (OSError, ValueError) as e:
+            print(f"Error loading mood index from {path}: {e}")
+            return 0
+        loaded = 0
+        for row in rows:
+            try:
+                self._add_row(row)
+                loaded += 1
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Warning: skipping mood index row {row!r}: {e}")
+        return loaded
+
+    # Refresh from the API
+
+    def harvest(self, emotions=None, languages=None, per_tag=20, token_info=None):
+        """
+        Search Spotify for every tag of `emotions` in every language and index the results.
+        A track's weight for a tag falls with its rank in that search. Runs at background
+        priority; returns the number of searches made.
+        """
+        emotions = emotions or EMOTIONS
+        languages = languages or list(spotify_module.language_queries)
+        # Tags shared between emotions are searched once
+        tags = list(dict.fromkeys(tag for emotion in emotions for tag in spotify_module.emotion_genres[emotion]))
+        limit = max(1, min(per_tag, 50))
+        searches = 0
+        with background():
+            sp = spotify_module.get_spotify_client(token_info)
+            for language in languages:
+                queries = [harvest_query(tag, language) for tag in tags]
+                for tag, (_, results, error) in zip(tags, spotify_module._search_in_order(sp, queries, "track", limit)):
+                    searches += 1
+                    if error is not None:
+                        print(f"Error harvesting '{tag}' in {language}: {error}")
+                        continue
+                    items = ((results or {}).get("tracks") or {}).get("items") or []
+                    for rank, item in enumerate(item for item in items if item and "uri" in item):
+                        self.add(spotify_module._track_summary(item), {tag: 1.0 - rank / limit}, [language])
+        return searches
+
+
+def harvest_query(tag, language):
+    return f"{tag} {language.lower()}"
+
+
+def _parse_tags(tags):
+    if isinstance(tags, dict):
+        return tags
+    if isinstance(tags, str):
+        tags = tags.split("|")
+    parsed = {}
+    for entry in filter(None, tags):
+        tag, _, weight = entry.rpartition(":") if ":" in entry else (entry, "", "1")
+        parsed[tag] = float(weight)
+    return parsed
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide index, loaded from MOOD_INDEX_PATH on first use (empty if there's no file)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = MoodIndex()
+            if index_path and os.path.exists(index_path):
+                _index.load(index_path)
+        return _index
+
+
+def get_tracks_for_emotion_and_language(emotion, language, limit=10):
+    """Tracks for a mood from the shared data plane if there is one, else the local index; no API calls"""
+    plane = shared_index.get_plane()
+    if plane is not None:
+        return plane.tracks_for(emotion, language, limit)
+    return get_index().tracks_for(emotion, language, limit)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build and query the local mood track index")
+    parser.add_argument("--index", default=index_path, help="index file (.json or .csv)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    harvest = commands.add_parser("harvest", help="refresh the index from Spotify search")
+    harvest.add_argument("--emotions", nargs="*", choices=EMOTIONS)
+    harvest.add_argument("--languages", nargs="*", choices=list(spotify_module.language_queries))
+    harvest.add_argument("--per-tag", type=int, default=20)
+    importer = commands.add_parser("import", help="merge a JSON or CSV file into the index")
+    importer.add_argument("paths", nargs="+")
+    query = commands.add_parser("query", help="show the top tracks for a mood")
+    query.add_argument("emotion", choices=EMOTIONS)
+    query.add_argument("language", nargs="?")
+    query.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    index = MoodIndex()
+    if os.path.exists(args.index):
+        index.load(args.index)
+    if args.command == "harvest":
+        searches = index.harvest(args.emotions, args.languages, args.per_tag)
+        index.save(args.index)
+        print(f"Indexed {len(index)} tracks from {searches} searches into {args.index}")
+    elif args.command == "import":
+        for path in args.paths:
+            print(f"Imported {index.load(path)} tracks from {path}")
+        index.save(args.index)
+    else:
+        start = time.perf_counter()
+        tracks = index.tracks_for(args.emotion, args.language, args.limit)
+        elapsed = time.perf_counter() - start
+        for track in tracks:
+            print(f"{track.name} - {track.artist}  {track.url}")
+        print(f"{len(tracks)} of {len(index)} tracks in {elapsed * 1000:.2f} ms")
@@ -0,0 +1,153 @@
+"""
+Vectorized mood scoring for candidate tracks.
+
+Candidates are rows of a float32 feature matrix:
+
+  - audio attributes (energy, valence, tempo, danceability, acousticness), scaled
+    to 0..1 and centered on 0.5, so an unknown attribute counts as neutral,
+  - one column per genre tag in spotify_module.emotion_genres, holding the tag's
+    weight for the track (0 when it wasn't found under that tag),
+
+plus a boolean column per language. Each mood becomes a weight vector over the same
+columns: its "profile" in MOOD_MAPPING for the attributes and 1/len(tags) for each of
+its emotion's tags. Scoring a whole candidate pool is then one matrix-vector product,
+a requested language masks out every row not in it, and the top k come out of
+np.argpartition without sorting the pool, which keeps a 100k-track pool well inside an
+interactive latency budget.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+import spotify_module
+from moods import MOOD_MAPPING
+
+ATTRIBUTES = ("energy", "valence", "tempo", "danceability", "acousticness")
+TAGS = tuple(sorted({tag for tags in spotify_module.emotion_genres.values() for tag in tags}))
+FEATURES = ATTRIBUTES + TAGS
+# Separate lookups: "energy" is both an attribute and one of the energetic tags
+_attribute_columns = {name: column for column, name in enumerate(ATTRIBUTES)}
+_tag_columns = {tag: len(ATTRIBUTES) + column for column, tag in enumerate(TAGS)}
+
+# Tempo in BPM is scaled onto 0..1 over this range
+tempo_range = (60.0, 180.0)
+
+_profiles = {mood["emotion"]: mood.get("profile", {}) for mood in MOOD_MAPPING.values()}
+
+
+def attribute_vector(attributes):
+    """Centered attribute values for {name: value}; missing or invalid ones are 0 (neutral)"""
+    vector = np.zeros(len(ATTRIBUTES), dtype=np.float32)
+    for column, name in enumerate(ATTRIBUTES):
+        try:
+            value = float((attributes or {}).get(name))
+        except (TypeError, ValueError):
+            continue
+        if name == "tempo":
+            low, high = tempo_range
+            value = (value - low) / (high - low)
+        if np.isfinite(value):
+            vector[column] = min(max(value, 0.0), 1.0) - 0.5
+    return vector
+
+
+def feature_vector(tags, attributes=None):
+    """One candidate's row: attributes, then tag weights (tags outside emotion_genres are ignored)"""
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    if attributes:
+        vector[:len(ATTRIBUTES)] = attribute_vector(attributes)
+    for tag, weight in tags.items():
+        column = _tag_columns.get(tag)
+        if column is not None:
+            vector[column] = weight
+    return vector
+
+
+@lru_cache(maxsize=None)
+def mood_weights(emotion):
+    """Weight vector over FEATURES for an emotion (read-only); zeros for unknown emotions"""
+    weights = np.zeros(len(FEATURES), dtype=np.float32)
+    for name, weight in _profiles.get(emotion, {}).items():
+        weights[_attribute_columns[name]] = weight
+    tags = spotify_module.emotion_genres.get(emotion, ())
+    for tag in tags:
+        weights[_tag_columns[tag]] = 1.0 / len(tags)
+    weights.flags.writeable = False
+    return weights
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first (ties by index); O(n + k log k)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+class CandidateMatrix:
+    """A scored-together pool of candidates: keys, feature rows and language membership"""
+
+    __slots__ = ("keys", "features", "languages", "language_columns")
+
+    def __init__(self, keys, features, languages, language_columns):
+        self.keys = keys                          # one per row, e.g. Track records
+        self.features = features                  # float32 (n, len(FEATURES))
+        self.languages = languages                # bool (n, len(language_columns))
+        self.language_columns = language_columns  # language name -> column
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, keys, tags, attributes=None, languages=None):
+        """
+        Matrix for `keys` from parallel sequences of {tag: weight}, attribute dicts and
+        language collections (attributes and languages may be None).
+        """
+        keys = list(keys)
+        features = np.zeros((len(keys), len(FEATURES)), dtype=np.float32)
+        rows, columns, weights = [], [], []
+        for row, track_tags in enumerate(tags):
+            for tag, weight in track_tags.items():
+                column = _tag_columns.get(tag)
+                # Tags outside emotion_genres (e.g. imported ones) don't score
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    weights.append(weight)
+        features[rows, columns] = weights
+        for row, track_attributes in enumerate(attributes or ()):
+            if track_attributes:
+                features[row, :len(ATTRIBUTES)] = attribute_vector(track_attributes)
+
+        language_columns = {}
+        memberships = []
+        for row, track_languages in enumerate(languages or ()):
+            for language in track_languages:
+                memberships.append((row, language_columns.setdefault(language, len(language_columns))))
+        membership = np.zeros((len(keys), len(language_columns)), dtype=bool)
+        if memberships:
+            membership[tuple(zip(*memberships))] = True
+        return cls(keys, features, membership, language_columns)
+
+    def scores(self, emotion, language=None):
+        """Mood score for every row; -inf for rows that don't fit the mood at all or aren't in `language`"""
+        mood = self.features @ mood_weights(emotion)
+        eligible = mood > 0
+        if language is not None:
+            column = self.language_columns.get(language)
+            if column is None:
+                eligible[:] = False
+            else:
+                eligible &= self.languages[:, column]
+        return np.where(eligible, mood, -np.inf)
+
+    def rank(self, emotion, language=None, limit=10):
+        """Keys of the `limit` best-fitting rows, only ones in `language` if given, best first"""
+        total = self.scores(emotion, language)
+        best = top_k(total, limit)
+        return [self.keys[row] for row in best if np.isfinite(total[row])]
@@ -0,0 +1,60 @@
+"""Mood definitions shared by the app and the background jobs."""
+
+# Define mood mappings with emojis and mesmerizing color combinations
+MOOD_MAPPING = {
+    "⚡ Energetic": {
+        "emotion": "energetic",
+        "color": "#FF4D4D",  # Vibrant red
+        "gradient": ["#FF4D4D", "#FF8C42", "#FFA07A"],
+        "secondary_gradient": ["#FFD141", "#FF8C42"],
+        "contrast": "#2A2A3C",
+        "icon": "⚡",
+        # Mood scoring weights for audio attributes (see mood_ranking)
+        "profile": {"energy": 1.0, "tempo": 0.6, "valence": 0.3, "danceability": 0.3, "acousticness": -0.5}
+    },
+    "💝 Romantic": {
+        "emotion": "romantic",
+        "color": "#FF69B4",  # Hot pink
+        "gradient": ["#FF69B4", "#FFB6C1", "#FFC0CB"],
+        "secondary_gradient": ["#FF1493", "#FF69B4"],
+        "contrast": "#2D1F2A",
+        "icon": "💝",
+        "profile": {"energy": -0.3, "valence": 0.5, "tempo": -0.3, "acousticness": 0.3}
+    },
+    "💔 Heartbroken": {
+        "emotion": "heartbroken",
+        "color": "#4A4A8F",  # Deep blue
+        "gradient": ["#4A4A8F", "#6B6BB8", "#8080C0"],
+        "secondary_gradient": ["#483D8B", "#6959CD"],
+        "contrast": "#1A1A2E",
+        "icon": "💔",
+        "profile": {"energy": -0.6, "valence": -1.0, "tempo": -0.3, "acousticness": 0.5}
+    },
+    "🎉 Party": {
+        "emotion": "party",
+        "color": "#FF1493",  # Deep pink
+        "gradient": ["#FF1493", "#FF69B4", "#FFB6C1"],
+        "secondary_gradient": ["#FF00FF", "#FF1493"],
+        "contrast": "#2A1F2D",
+        "icon": "🎉",
+        "profile": {"energy": 0.7, "valence": 0.6, "tempo": 0.4, "danceability": 1.0}
+    },
+    "😠 Angry": {
+        "emotion": "angry",
+        "color": "#8B0000",  # Dark red
+        "gradient": ["#8B0000", "#B22222", "#CD5C5C"],
+        "secondary_gradient": ["#DC143C", "#8B0000"],
+        "contrast": "#1A0F0F",
+        "icon": "😠",
+        "profile": {"energy": 1.0, "valence": -0.8, "tempo": 0.5, "acousticness": -0.6}
+    }
+}
+
+# Update mood quotes for the new moods
+MOOD_QUOTES = {
+    "⚡ Energetic": "Time to get pumped up and moving!",
+    "💝 Romantic": "Let love fill the air with sweet melodies.",
+    "💔 Heartbroken": "Music heals the heart's deepest wounds.",
+    "🎉 Party": "Let's turn up the fun and dance!",
+    "😠 Angry": "Channel that energy into powerful beats."
+}
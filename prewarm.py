@@ -0,0 +1,110 @@
+"""
+Prewarm the playlist recommendation cache for every emotion x language combination.
+
+Runs once from the command line, on a schedule, or as a background thread at app start:
+
+    python prewarm.py                      # fill the cache once
+    python prewarm.py --every 3600         # then refresh every hour
+    EMOTUNES_PREWARM=1 streamlit run app.py
+
+All requests run at background priority, so users' clicks are always served first,
+and the job paces itself to stay within a requests-per-minute budget.
+"""
+import argparse
+import os
+import threading
+import time
+
+import spotify_module
+from moods import MOOD_MAPPING
+from spotify_scheduler import background, counting
+
+# Upstream requests per minute the job may spend
+default_budget = float(os.getenv("PREWARM_REQUESTS_PER_MINUTE", "60"))
+# Seconds between scheduled refreshes
+default_interval = float(os.getenv("PREWARM_INTERVAL", "3600"))
+
+
+def combinations():
+    """Every (emotion, language) pair, starting with the moods the app offers"""
+    emotions = [mood["emotion"] for mood in MOOD_MAPPING.values()]
+    emotions += [emotion for emotion in spotify_module.emotion_genres if emotion not in emotions]
+    return [(emotion, language) for emotion in emotions for language in spotify_module.language_queries]
+
+
+def prewarm(budget=default_budget, force=False, stop_event=None):
+    """
+    Fetch recommendations for every combination, pacing requests to `budget` per minute.
+    With force=True each combination is refetched even if it's already cached.
+    Returns {"combinations", "playlists", "requests"}.
+    """
+    summary = {"combinations": 0, "playlists": 0, "requests": 0}
+    for emotion, language in combinations():
+        if stop_event is not None and stop_event.is_set():
+            break
+        # Counted per context, so users' calls meanwhile don't eat into the budget
+        with background(), counting() as requests:
+            if force:
+                playlists = spotify_module.refresh_playlist_cache(emotion, language)
+            else:
+                playlists = spotify_module.get_playlist_for_emotion_and_language(emotion, language)
+        requests_made = requests["calls"]
+        summary["combinations"] += 1
+        summary["playlists"] += len(playlists)
+        summary["requests"] += requests_made
+
+        # Only spend budget time when the API was actually used (not on cache hits)
+        if requests_made and budget:
+            pause = requests_made * 60.0 / budget
+            if stop_event is not None:
+                stop_event.wait(pause)
+            else:
+                time.sleep(pause)
+    return summary
+
+
+def run_forever(interval=default_interval, budget=default_budget, stop_event=None):
+    """Fill the cache, then refresh every combination every `interval` seconds"""
+    stop_event = stop_event or threading.Event()
+    summary = prewarm(budget, stop_event=stop_event)
+    print(f"Prewarmed {summary['combinations']} combinations with {summary['requests']} requests")
+    while not stop_event.wait(interval):
+        summary = prewarm(budget, force=True, stop_event=stop_event)
+        print(f"Refreshed {summary['combinations']} combinations with {summary['requests']} requests")
+
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def start_background_prewarm(interval=default_interval, budget=default_budget):
+    """Start the prewarm/refresh loop in a daemon thread, once per process"""
+    global _thread
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(
+                target=run_forever, args=(interval, budget), name="emotunes-prewarm", daemon=True
+            )
+            _thread.start()
+    return _thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prewarm EmoTunes playlist recommendations")
+    parser.add_argument("--budget", type=float, default=default_budget,
+                        help="upstream requests per minute (default: %(default)s)")
+    parser.add_argument("--every", type=float, metavar="SECONDS",
+                        help="keep running and refresh every SECONDS")
+    parser.add_argument("--force", action="store_true", help="refetch combinations that are already cached")
+    args = parser.parse_args(argv)
+
+    if args.every:
+        run_forever(args.every, args.budget)
+    else:
+        summary = prewarm(args.budget, force=args.force)
+        print(f"Prewarmed {summary['combinations']} combinations "
+              f"({summary['playlists']} playlists, {summary['requests']} requests)")
+
+
+if __name__ == "__main__":
+    main()
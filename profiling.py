@@ -0,0 +1,137 @@
+"""
+Lightweight render-time profiling for app.py reruns and Spotify calls.
+
+Switched on with EMOTUNES_PROFILE=1. Code marks what it wants measured with
+
+    with profiling.section("search_results"):
+        ...
+
+and the timings aggregate per section into count, total, p50 and p95 over a rolling
+window. When profiling is off, section() hands back one shared no-op context manager,
+so instrumented code pays a single attribute check per section.
+
+Results can be exported as JSON or in the Prometheus text format (e.g. for the
+node_exporter textfile collector); set EMOTUNES_PROFILE_FILE and app.py rewrites
+the file at the end of every rerun. The format follows the extension: .prom or .txt
+for Prometheus, anything else for JSON.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Samples kept per section for the percentiles
+window = int(os.getenv("EMOTUNES_PROFILE_WINDOW", 1000))
+
+_noop = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # Recorded even when the section raises (st.rerun and st.stop work by raising)
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Profiler:
+    """Collects section timings; thread-safe, so Spotify calls from worker threads can record too"""
+
+    def __init__(self, enabled=False, window=window):
+        self.enabled = enabled
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def section(self, name):
+        """Context manager timing the enclosed block under `name`"""
+        if not self.enabled:
+            return _noop
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def summary(self):
+        """{section: {"count", "total", "p50", "p95"}} with times in seconds"""
+        with self._lock:
+            snapshot = {name: (sorted(samples), *self._totals[name]) for name, samples in self._samples.items()}
+        return {
+            name: {
+                "count": count,
+                "total": total,
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95)
+            }
+            for name, (ordered, count, total) in sorted(snapshot.items())
+        }
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP emotunes_section_seconds Time spent in an app section or Spotify call.",
+            "# TYPE emotunes_section_seconds summary"
+        ]
+        for name, stats in self.summary().items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'emotunes_section_seconds{{section="{label}",quantile="0.5"}} {stats["p50"]:.6f}')
+            lines.append(f'emotunes_section_seconds{{section="{label}",quantile="0.95"}} {stats["p95"]:.6f}')
+            lines.append(f'emotunes_section_seconds_sum{{section="{label}"}} {stats["total"]:.6f}')
+            lines.append(f'emotunes_section_seconds_count{{section="{label}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the summary to `path`, atomically so scrapers never see a partial file"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error exporting profile to {path}: {e}")
+
+
+# Process-wide profiler used by the app and the Spotify modules
+profiler = Profiler(enabled=os.getenv("EMOTUNES_PROFILE") == "1")
+section = profiler.section
+
+
+def export_from_env():
+    """Export to EMOTUNES_PROFILE_FILE if profiling is on and a file is configured"""
+    path = os.getenv("EMOTUNES_PROFILE_FILE")
+    if profiler.enabled and path:
+        profiler.export(path)
@@ -0,0 +1,289 @@
+"""
+Compact record types for search results and playlists.
+
+Tracks, artists and playlists are held by every cache tier and in each session's
+state, so they are slotted dataclasses rather than dicts: no per-instance __dict__,
+artist names interned so repeated names share one string, and the Spotify ID stored
+once, packed into a 128-bit int. The URI, open.spotify.com URL and embed URL are
+derived from it on access rather than stored.
+
+Records still read like the dicts they replace (record['name'], record.get('image'))
+and convert with to_dict() wherever plain JSON is needed (the disk cache).
+"""
+import sys
+from dataclasses import dataclass, fields
+
+# Spotify's base62 alphabet; IDs are 128-bit values written as 22 of these digits
+BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_digits = {char: value for value, char in enumerate(BASE62)}
+
+
+def pack_id(spotify_id):
+    """22-character base62 ID -> int below 2**128, or None if it isn't a well-formed ID"""
+    if len(spotify_id) != 22:
+        return None
+    value = 0
+    for char in spotify_id:
+        digit = _digits.get(char)
+        if digit is None:
+            return None
+        value = value * 62 + digit
+    return value if value < 1 << 128 else None
+
+
+def unpack_id(packed):
+    """Inverse of pack_id"""
+    chars = []
+    for _ in range(22):
+        packed, digit = divmod(packed, 62)
+        chars.append(BASE62[digit])
+    return "".join(reversed(chars))
+
+
+def pack_uri(uri):
+    """spotify:<type>:<id> -> packed ID; any other URI (local files, legacy user playlists) is kept as is"""
+    prefix, _, spotify_id = uri.rpartition(":")
+    packed = pack_id(spotify_id) if prefix.count(":") == 1 else None
+    return uri if packed is None else packed
+
+
+def unpack_uri(kind, packed):
+    """Inverse of pack_uri for a URI of type `kind` ('track', 'playlist', ...)"""
+    return packed if isinstance(packed, str) else f"spotify:{kind}:{unpack_id(packed)}"
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _external_url(item, record):
+    """The item's Spotify URL, or None when it's just the canonical one for the record"""
+    url = (item.get("external_urls") or {}).get("spotify")
+    return None if not url or url == record.url else url
+
+
+class _Record:
+    """Dict-style read access shared by the record types"""
+    __slots__ = ()
+
+    # Keys as they appear in to_dict(), in order
+    _keys = ()
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._keys else default
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def keys(self):
+        return self._keys
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self._keys}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a record from to_dict() output (or an older cached dict of the same shape)"""
+        if isinstance(data, cls):
+            return data
+        names = {f.name for f in fields(cls)}
+        values = {key: value for key, value in data.items() if key in names}
+        record = cls(packed_id=pack_uri(data["uri"]), **values)
+        return record._with_url(data.get("url"))
+
+    def _with_url(self, url):
+        """Copy of the record keeping `url` only if it differs from the derived one"""
+        if not url or url == self.url:
+            return self
+        values = {f.name: getattr(self, f.name) for f in fields(self)}
+        return type(self)(**{**values, "external_url": url})
+
+    @property
+    def spotify_id(self):
+        """The 22-character base62 ID (or the last URI segment for non-standard URIs)"""
+        packed = self.packed_id
+        return packed.rpartition(":")[2] if isinstance(packed, str) else unpack_id(packed)
+
+    @property
+    def uri(self):
+        return unpack_uri(self.kind, self.packed_id)
+
+    @property
+    def url(self):
+        return self.external_url or f"https://open.spotify.com/{self.kind}/{self.spotify_id}"
+
+    @property
+    def embed_url(self):
+        return f"https://open.spotify.com/embed/{self.kind}/{self.spotify_id}"
+
+
+@dataclass(frozen=True, slots=True)
+class Track(_Record):
+    name: str
+    artist: str
+    # pack_uri(uri): an int for standard URIs, the URI string otherwise
+    packed_id: object
+    preview_url: str = None
+    external_url: str = None
+
+    kind = "track"
+    _keys = ("name", "artist", "url", "uri", "preview_url")
+
+    def __post_init__(self):
+        object.__setattr__(self, "artist", _intern(self.artist))
+
+    @classmethod
+    def from_api(cls, track):
+        record = cls(
+            name=track["name"],
+            artist=track["artists"][0]["name"],
+            packed_id=pack_uri(track["uri"]),
+            preview_url=track.get("preview_url")
+        )
+        return record._with_url(_external_url(track, record))
+
+
+@dataclass(frozen=True, slots=True)
+class Artist(_Record):
+    name: str
+    packed_id: object
+    external_url: str = None
+
+    kind = "artist"
+    _keys = ("name", "url", "uri")
+
+    def __post_init__(self):
+        object.__setattr__(self, "name", _intern(self.name))
+
+    @classmethod
+    def from_api(cls, artist):
+        record = cls(name=artist["name"], packed_id=pack_uri(artist["uri"]))
+        return record._with_url(_external_url(artist, record))
+
+
+@dataclass(frozen=True, slots=True)
+class Playlist(_Record):
+    name: str
+    packed_id: object
+    description: str = ""
+    image: str = None
+    external_url: str = None
+    # Changes whenever the playlist's items do
+    snapshot_id: str = None
+
+    kind = "playlist"
+    _keys = ("name", "url", "uri", "description", "image", "snapshot_id")
+
+    @classmethod
+    def from_api(cls, playlist):
+        images = playlist.get("images")
+        record = cls(
+            name=playlist.get("name", "Untitled Playlist"),
+            packed_id=pack_uri(playlist["uri"]),
+            description=playlist.get("description", ""),
+            image=images[0].get("url") if images else None,
+            snapshot_id=playlist.get("snapshot_id")
+        )
+        return record._with_url(_external_url(playlist, record))
+
+
+def to_json(value):
+    """Copy of `value` with every record replaced by its dict, ready for json.dumps"""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    return value
+
+
+def search_results_from_json(results):
+    """{'tracks': [...], 'artists': [...]} of dicts back into records"""
+    return {
+        "tracks": [Track.from_dict(track) for track in results.get("tracks", [])],
+        "artists": [Artist.from_dict(artist) for artist in results.get("artists", [])]
+    }
+
+
+def playlists_from_json(playlists):
+    return [Playlist.from_dict(playlist) for playlist in playlists]
+
+
+def _packed(item):
+    return item.packed_id if isinstance(item, _Record) else pack_uri(item)
+
+
+class UriSet:
+    """
+    Insertion-ordered set of Spotify URIs of one type, held as packed IDs.
+
+    Membership, add and discard are O(1); iteration yields URIs in the order they
+    were first added, which is the order playlist creation wants. Records can be
+    passed anywhere a URI can.
+    """
+    __slots__ = ("kind", "_items")
+
+    def __init__(self, uris=(), kind="track"):
+        self.kind = kind
+        self._items = dict.fromkeys(_packed(uri) for uri in uris)
+
+    def add(self, uri):
+        """Add a URI; returns True if it wasn't already present"""
+        packed = _packed(uri)
+        if packed in self._items:
+            return False
+        self._items[packed] = None
+        return True
+
+    def update(self, uris):
+        for uri in uris:
+            self.add(uri)
+
+    def discard(self, uri):
+        self._items.pop(_packed(uri), None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __contains__(self, uri):
+        return _packed(uri) in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return (unpack_uri(self.kind, packed) for packed in self._items)
+
+    def __repr__(self):
+        return f"UriSet({list(self)!r}, kind={self.kind!r})"
+
+
+def merge_unique(groups, limit=None, seen=None, interleave=False):
+    """
+    Merge several ranked result lists into one, keeping the first occurrence of each URI.
+
+    Linear in the total number of candidates, so raising per-query limits into the
+    thousands stays cheap. With interleave=True the lists are merged round-robin
+    (best of each query first) instead of one after another. `seen` (a UriSet) lets
+    callers merge incrementally and skip items they already hold.
+    """
+    seen = UriSet() if seen is None else seen
+    merged = []
+    if interleave:
+        groups = [list(group) for group in groups]
+        ordered = (group[rank] for rank in range(max(map(len, groups), default=0))
+                   for group in groups if rank < len(group))
+    else:
+        ordered = (item for group in groups for item in group)
+    for item in ordered:
+        if limit is not None and len(merged) >= limit:
+            break
+        if seen.add(item):
+            merged.append(item)
+    return merged
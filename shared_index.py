@@ -0,0 +1,339 @@
+"""
+Read-only data plane shared by every Streamlit worker process.
+
+A builder writes the mood index, the similarity index and the cached playlist
+recommendations into one file of flat arrays:
+
+  - track and playlist tables: 128-bit IDs as two uint64 columns, sorted copies for
+    binary-search lookups, and text fields as UTF-8 blobs with offset arrays,
+  - the mood_ranking feature matrix and language membership,
+  - the similarity embeddings and LSH codes,
+  - (emotion, language) -> slices of the playlist table.
+
+Workers map the file read-only and use the arrays in place, so the page cache holds
+one copy however many workers there are, and a worker's own memory stays flat as the
+index grows. Rebuilding writes a new generation next to the live one and swaps it in
+with os.replace: workers notice the new file within `check_interval` seconds and
+map it, while lookups already running finish on the old mapping. No restart needed.
+
+    python shared_index.py build   # from MOOD_INDEX_PATH and the playlist disk cache,
+                                   # to SHARED_INDEX_PATH
+    python shared_index.py info
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+import spotify_module
+from mood_ranking import CandidateMatrix
+from records import Playlist, Track, pack_uri
+
+# Seconds between checks for a new generation
+check_interval = float(os.getenv("SHARED_INDEX_CHECK_INTERVAL", "5"))
+
+_magic = b"EMOPLANE"
+_alignment = 64
+
+# Text fields stored per table; empty strings read back as None for the optional ones
+_tables = {
+    "tracks": (Track, ("name", "artist", "preview_url", "external_url"), {"preview_url", "external_url"}),
+    "playlists": (Playlist, ("name", "description", "image", "external_url", "snapshot_id"),
+                  {"image", "external_url", "snapshot_id"}),
+}
+
+
+def _align(offset):
+    return -(-offset // _alignment) * _alignment
+
+
+def _strings(values):
+    """UTF-8 blob and offsets (n + 1) for a list of strings (None stored as "")"""
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _table_arrays(name, records):
+    """Arrays for one table of records: IDs, their sorted order, and text columns"""
+    _, fields, _ = _tables[name]
+    packed_ids = [record.packed_id for record in records]
+    # Standard IDs split into two uint64 halves; the odd non-standard URI is kept as text
+    ids = np.array([divmod(packed, 1 << 64) if isinstance(packed, int) else (0, 0) for packed in packed_ids],
+                   dtype=np.uint64).reshape(-1, 2)
+    order = np.lexsort((ids[:, 1], ids[:, 0])).astype(np.int64)
+    arrays = {f"{name}.ids": ids, f"{name}.id_order": order, f"{name}.sorted_ids": ids[order]}
+    columns = {field: [getattr(record, field) for record in records] for field in fields}
+    columns["uri"] = [packed if isinstance(packed, str) else "" for packed in packed_ids]
+    for field, values in columns.items():
+        arrays[f"{name}.{field}"], arrays[f"{name}.{field}_offsets"] = _strings(values)
+    return arrays
+
+
+def write_plane(path, arrays, meta, generation):
+    """Write arrays and JSON metadata as one generation file and swap it in atomically"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({"generation": generation, "meta": meta, "arrays": layout}).encode("utf-8")
+    data_start = _align(len(_magic) + 8 + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_magic + struct.pack("<Q", len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Table:
+    """Records in a mapped table, looked up by row or by packed ID without per-process copies"""
+
+    def __init__(self, plane, name):
+        self.name = name
+        self.record_type, self.fields, self.optional = _tables[name]
+        self._arrays = plane.arrays
+        self._ids = plane.arrays[f"{name}.ids"]
+        self._order = plane.arrays[f"{name}.id_order"]
+        self._sorted_ids = plane.arrays[f"{name}.sorted_ids"]
+        # Non-standard URIs are rare enough to keep in a dict
+        uris = plane.meta.get(f"{name}.uris", {})
+        self._uri_rows = {uri: int(row) for uri, row in uris.items()}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _text(self, field, row):
+        offsets = self._arrays[f"{self.name}.{field}_offsets"]
+        return self._arrays[f"{self.name}.{field}"][offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def packed_id(self, row):
+        high, low = self._ids[row].tolist()
+        return self._text("uri", row) or high << 64 | low
+
+    def record(self, row):
+        row = int(row)
+        values = {}
+        for field in self.fields:
+            value = self._text(field, row)
+            values[field] = (value or None) if field in self.optional else value
+        return self.record_type(packed_id=self.packed_id(row), **values)
+
+    def row_of(self, packed):
+        """Row of a packed ID (or URI), or None"""
+        if isinstance(packed, str):
+            packed = pack_uri(packed)
+            if isinstance(packed, str):
+                return self._uri_rows.get(packed)
+        high, low = divmod(packed, 1 << 64)
+        if high >> 64:
+            return None
+        # Binary search on the high half, then on the low half within its run
+        highs = self._sorted_ids[:, 0]
+        start, end = np.searchsorted(highs, high, "left"), np.searchsorted(highs, high, "right")
+        index = start + np.searchsorted(self._sorted_ids[start:end, 1], low)
+        if index < end and self._sorted_ids[index, 1] == low:
+            return int(self._order[index])
+        return None
+
+
+class Plane:
+    """One mapped generation of the data plane"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.identity = os.fstat(f.fileno()).st_ino
+        if self._mmap[:len(_magic)] != _magic:
+            raise ValueError(f"{path} is not a data plane file")
+        header_size, = struct.unpack_from("<Q", self._mmap, len(_magic))
+        header = json.loads(self._mmap[len(_magic) + 8:len(_magic) + 8 + header_size])
+        data_start = _align(len(_magic) + 8 + header_size)
+        self.generation = header["generation"]
+        self.meta = header["meta"]
+        self.arrays = {}
+        for name, spec in header["arrays"].items():
+            count = int(np.prod(spec["shape"]))
+            if count:
+                array = np.frombuffer(self._mmap, dtype=spec["dtype"], count=count, offset=data_start + spec["offset"])
+            else:
+                array = np.empty(0, dtype=spec["dtype"])
+            self.arrays[name] = array.reshape(spec["shape"])
+        self.tracks = _Table(self, "tracks")
+        self.playlist_table = _Table(self, "playlists")
+        self._similarity = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return len(self._mmap)
+
+    def matrix(self):
+        """Mood ranking matrix over the track table (keys are rows)"""
+        return CandidateMatrix(range(len(self.tracks)), self.arrays["tracks.features"],
+                               self.arrays["tracks.languages"], self.meta["languages"])
+
+    def tracks_for(self, emotion, language=None, limit=10):
+        """Same as MoodIndex.tracks_for, over the shared arrays"""
+        language = language.strip().lower() if language else None
+        return [self.tracks.record(row) for row in self.matrix().rank(emotion.strip().lower(), language, limit)]
+
+    def similarity(self):
+        """SimilarityIndex over the shared embeddings; tracks added to it stay in this process"""
+        from similarity import SimilarityIndex
+
+        with self._lock:
+            if self._similarity is None:
+                arrays = self.arrays
+                self._similarity = SimilarityIndex.mapped(
+                    self.meta["bits"], arrays["similarity.vectors"], arrays["similarity.codes"],
+                    arrays["similarity.order"], arrays["similarity.sorted_codes"], self.tracks
+                )
+            return self._similarity
+
+    def playlists(self, key, max_age=None):
+        """Playlists recorded for a playlist cache key, or None (also when the plane is older than `max_age` seconds)"""
+        span = self.meta["playlist_sets"].get(json.dumps(key))
+        if span is None:
+            return None
+        if max_age is not None and time.time() - self.meta.get("built_at", 0) > max_age:
+            return None
+        rows = self.arrays["playlist_rows"][span[0]:span[1]]
+        return [self.playlist_table.record(row) for row in rows]
+
+
+def build_plane(path=None, source=None, playlist_sets=None, bits=None):
+    """
+    Write a new generation from a MoodIndex (the shared one by default) and
+    {playlist cache key: playlists} (by default every combination in the disk cache).
+    Returns the generation number.
+    """
+    import mood_index
+    import similarity
+
+    path = path or spotify_module.shared_index_path
+    source = source if source is not None else mood_index.get_index()
+    if playlist_sets is None:
+        playlist_sets = collect_playlists()
+    bits = bits or similarity.default_bits
+
+    matrix = source.matrix()
+    tracks = matrix.keys
+    norms = np.linalg.norm(matrix.features, axis=1, keepdims=True)
+    vectors = np.divide(matrix.features, norms, out=np.zeros_like(matrix.features), where=norms > 0)
+    codes = similarity.SimilarityIndex(bits)._code(vectors).astype(np.int64)
+    order = np.argsort(codes, kind="stable")
+
+    playlists, spans, rows, playlist_rows = [], {}, {}, []
+    for key, items in playlist_sets.items():
+        start = len(playlist_rows)
+        for playlist in items:
+            row = rows.get(playlist.packed_id)
+            if row is None:
+                row = rows[playlist.packed_id] = len(playlists)
+                playlists.append(playlist)
+            playlist_rows.append(row)
+        spans[json.dumps(list(key))] = [start, len(playlist_rows)]
+
+    arrays = {
+        **_table_arrays("tracks", tracks),
+        **_table_arrays("playlists", playlists),
+        "tracks.features": matrix.features,
+        "tracks.languages": matrix.languages,
+        "similarity.vectors": vectors,
+        "similarity.codes": codes,
+        "similarity.order": order,
+        "similarity.sorted_codes": codes[order],
+        "playlist_rows": np.array(playlist_rows, dtype=np.int64),
+    }
+    meta = {
+        "languages": matrix.language_columns,
+        "bits": bits,
+        "playlist_sets": spans,
+        "tracks.uris": {track.packed_id: row for row, track in enumerate(tracks) if isinstance(track.packed_id, str)},
+        "playlists.uris": {p.packed_id: row for row, p in enumerate(playlists) if isinstance(p.packed_id, str)},
+        "built_at": time.time(),
+    }
+    generation = _current_generation(path) + 1
+    write_plane(path, arrays, meta, generation)
+    return generation
+
+
+def collect_playlists():
+    """{cache key: playlists} for every emotion x language combination in the disk cache"""
+    from prewarm import combinations
+
+    playlist_sets = {}
+    for emotion, language in combinations():
+        key = spotify_module._playlist_cache_key(emotion, language)
+        playlists = spotify_module._disk_playlists(key)
+        if playlists:
+            playlist_sets[key] = playlists
+    return playlist_sets
+
+
+def _current_generation(path):
+    try:
+        return Plane(path).generation
+    except (OSError, ValueError):
+        return 0
+
+
+_plane = None
+_checked_at = float("-inf")
+_plane_lock = threading.Lock()
+
+
+def get_plane():
+    """The current generation for this process (remapped when a new one is swapped in), or None"""
+    global _plane, _checked_at
+    now = time.monotonic()
+    if now - _checked_at < check_interval:
+        return _plane
+    with _plane_lock:
+        if now - _checked_at < check_interval:
+            return _plane
+        _checked_at = now
+        path = spotify_module.shared_index_path
+        try:
+            identity = os.stat(path).st_ino if path else None
+        except OSError:
+            identity = None
+        if identity is None:
+            _plane = None
+        elif _plane is None or _plane.identity != identity:
+            try:
+                _plane = Plane(path)
+            except (OSError, ValueError) as e:
+                print(f"Error mapping shared index {path}: {e}")
+        return _plane
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or inspect the shared read-only data plane")
+    parser.add_argument("--path", default=spotify_module.shared_index_path)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="write a new generation from the mood index and playlist cache")
+    commands.add_parser("info", help="describe the current generation")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        generation = build_plane(args.path)
+        print(f"Wrote generation {generation} to {args.path}")
+    else:
+        plane = Plane(args.path)
+        print(f"Generation {plane.generation}, {plane.nbytes / 1024 ** 2:,.1f} MiB")
+        print(f"  tracks: {len(plane.tracks):,}  playlists: {len(plane.playlist_table):,}"
+              f"  playlist sets: {len(plane.meta['playlist_sets']):,}")
@@ -0,0 +1,381 @@
+"""
+"More like this": approximate nearest neighbours over track embeddings.
+
+A track's embedding is its mood_ranking feature row (audio attributes and
+emotion_genres tag weights), L2-normalized so a dot product is cosine similarity.
+Embeddings are bucketed by random-projection LSH: `bits` random hyperplanes give
+each vector a code, one bit per side of a plane, and similar vectors tend to share
+codes. A lookup reads the query's bucket and the buckets one or two bits away,
+re-ranks those candidates exactly and falls back to a full scan only when they
+run short.
+
+The index is saved to SIMILARITY_INDEX_DIR as .npy files (embeddings, codes and
+packed track IDs) that are memory-mapped on startup, so every worker process shares
+the pages, plus a JSON manifest with the track names needed to show results.
+Tracks seen after the last save go into a small in-memory tail that lookups search
+too, and are written into the files on the next save(); app search results join the
+tail as they come in, embedded from the genre tags their query names.
+
+    python similarity.py build        # add mood index tracks not indexed yet, and save
+    python similarity.py query <uri>  # try it out
+"""
+import json
+import os
+import re
+import threading
+from itertools import combinations
+
+import numpy as np
+
+import mood_index
+import shared_index
+from mood_ranking import FEATURES, TAGS, feature_vector, top_k
+from records import Track, pack_uri
+
+index_dir = os.getenv("SIMILARITY_INDEX_DIR", ".emotunes_similarity")
+
+# Hyperplanes per code: 2**bits buckets
+default_bits = int(os.getenv("SIMILARITY_LSH_BITS", "12"))
+# Fixed so codes stay comparable between processes and saves
+projection_seed = 2024
+# Probing widens until at least this many candidates are re-ranked (or the probes run out)
+min_candidates = int(os.getenv("SIMILARITY_MIN_CANDIDATES", "2000"))
+
+_files = ("vectors.npy", "codes.npy", "ids.npy")
+# Track fields kept per base row in the manifest (the ID is in ids.npy)
+_columns = ("name", "artist", "preview_url", "external_url")
+
+
+def embed(tags, attributes=None):
+    """Unit-length embedding for a track's tags and attributes (all zeros if it has neither)"""
+    vector = feature_vector(tags, attributes)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _TrackList:
+    """Track fields for the base rows, held in lists (for an index loaded from .npy files)"""
+
+    def __init__(self, ids, columns):
+        self.ids = ids              # packed ID per row
+        self.columns = columns      # field name -> value per row
+        self._rows = {packed: row for row, packed in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, packed):
+        return self._rows.get(packed)
+
+    def record(self, row):
+        return Track(packed_id=self.ids[row], **{name: values[row] for name, values in self.columns.items()})
+
+
+class SimilarityIndex:
+    """Random-projection LSH over track embeddings: memory-mapped base plus an in-memory tail"""
+
+    def __init__(self, bits=default_bits):
+        self.bits = bits
+        self._planes = np.random.default_rng(projection_seed).standard_normal((len(FEATURES), bits)).astype(np.float32)
+        self._weights = (1 << np.arange(bits)).astype(np.int64)
+        self._vectors = np.zeros((0, len(FEATURES)), dtype=np.float32)  # base, usually a memmap
+        self._codes = np.zeros(0, dtype=np.int64)
+        self._order = self._sorted_codes = self._codes  # base rows sorted by code, for bucket lookups
+        self._table = _TrackList([], {name: [] for name in _columns})  # base rows' tracks
+        self._rows = {}             # packed ID -> row, for the tail
+        self._tail_tracks = []
+        self._tail_vectors = []
+        self._tail_buckets = {}     # code -> tail rows
+        self._tail_matrix = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._table) + len(self._tail_tracks)
+
+    def __contains__(self, track):
+        return self._row_of(track) is not None
+
+    def _row_of(self, track):
+        packed = _packed(track)
+        row = self._rows.get(packed)
+        return self._table.row_of(packed) if row is None else row
+
+    def _code(self, vectors):
+        return (vectors @ self._planes > 0) @ self._weights
+
+    def add(self, track, vector):
+        """Insert a track with its embedding; returns False if it's already indexed"""
+        return self.add_many([track], np.asarray(vector, dtype=np.float32)[None, :]) == 1
+
+    def add_many(self, tracks, vectors):
+        """Insert tracks with their embeddings (one row each), skipping indexed ones; returns how many were added"""
+        codes = self._code(vectors).tolist()
+        added = 0
+        with self._lock:
+            for track, vector, code in zip(tracks, vectors, codes):
+                if self._row_of(track) is not None:
+                    continue
+                row = len(self)
+                self._rows[_packed(track)] = row
+                self._tail_tracks.append(track)
+                self._tail_vectors.append(vector)
+                self._tail_buckets.setdefault(code, []).append(row)
+                added += 1
+            self._tail_matrix = None
+        return added
+
+    def sync(self, source=None):
+        """Insert every track in a MoodIndex (the shared one by default) that isn't indexed yet"""
+        source = source if source is not None else mood_index.get_index()
+        # The matrix is a consistent snapshot of the source's tracks, even while it changes
+        matrix = source.matrix()
+        rows = [row for row, track in enumerate(matrix.keys) if self._row_of(track.packed_id) is None]
+        if not rows:
+            return 0
+        # Embeddings are the ranking features, normalized in one pass
+        vectors = matrix.features[rows]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        return self.add_many([matrix.keys[row] for row in rows], vectors)
+
+    def _probes(self, code, distance):
+        """Codes exactly `distance` bits away from `code`"""
+        return [code ^ sum(1 << bit for bit in flipped) for flipped in combinations(range(self.bits), distance)]
+
+    def _candidates(self, code, distance):
+        base = len(self._codes)
+        rows = []
+        for probe in self._probes(code, distance):
+            lo, hi = np.searchsorted(self._sorted_codes, [probe, probe + 1])
+            if hi > lo:
+                rows.append(self._order[lo:hi])
+            tail = self._tail_buckets.get(probe)
+            if tail:
+                rows.append(np.asarray(tail))
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.intp), base
+
+    def _track(self, row):
+        base = len(self._codes)
+        return self._tail_tracks[row - base] if row >= base else self._table.record(row)
+
+    def _vectors_for(self, rows, base):
+        """Embeddings for row numbers spanning the base and the tail"""
+        if self._tail_matrix is None:
+            self._tail_matrix = (np.vstack(self._tail_vectors) if self._tail_vectors
+                                 else np.zeros((0, len(FEATURES)), dtype=np.float32))
+        in_base = rows < base
+        vectors = np.empty((len(rows), len(FEATURES)), dtype=np.float32)
+        vectors[in_base] = self._vectors[rows[in_base]]
+        vectors[~in_base] = self._tail_matrix[rows[~in_base] - base]
+        return vectors
+
+    def nearest(self, vector, limit=10, exclude=()):
+        """Tracks closest to `vector` by cosine similarity, best first"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if not vector.any():
+            return []
+        code = int(self._code(vector))
+        exclude = {row for row in map(self._row_of, exclude) if row is not None}
+        with self._lock:
+            found, base = [], len(self._codes)
+            wanted = max(min_candidates, limit + len(exclude))
+            # Multi-probe: widen to buckets one, then two bits away until there are enough candidates
+            for distance in range(3):
+                rows, base = self._candidates(code, distance)
+                found.append(rows)
+                if sum(map(len, found)) >= wanted:
+                    break
+            rows = np.concatenate(found)
+            if len(rows) < limit + len(exclude):
+                rows = np.arange(len(self))
+            rows = rows[~np.isin(rows, list(exclude))] if exclude else rows
+            scores = self._vectors_for(rows, base) @ vector
+            best = rows[top_k(scores, limit)]
+            return [self._track(row) for row in best]
+
+    def similar(self, track, limit=10):
+        """Tracks most like an indexed track (not including it); [] for tracks not in the index"""
+        with self._lock:
+            row = self._row_of(track)
+            if row is None:
+                return []
+            base = len(self._codes)
+            vector = self._vectors_for(np.array([row]), base)[0]
+        return self.nearest(vector, limit, exclude=[track])
+
+    # Persistence
+
+    def save(self, path=None):
+        """Write base and tail out as one set of files; the manifest goes last and names the row count"""
+        path = path or index_dir
+        with self._lock:
+            vectors = np.concatenate([self._vectors, *([np.vstack(self._tail_vectors)] if self._tail_vectors else [])])
+            codes = self._code(vectors) if len(vectors) else self._codes
+            tracks = [self._track(row) for row in range(len(self))]
+            packed_ids = [track.packed_id for track in tracks]
+            columns = {name: [getattr(track, name) for track in tracks] for name in _columns}
+            # 128-bit IDs as two uint64 halves; the odd non-standard URI goes in the manifest
+            ids = np.array([divmod(packed, 1 << 64) if isinstance(packed, int) else (0, 0) for packed in packed_ids],
+                           dtype=np.uint64).reshape(-1, 2)
+            manifest = {
+                "version": 1,
+                "bits": self.bits,
+                "features": list(FEATURES),
+                "count": len(packed_ids),
+                "uris": {row: packed for row, packed in enumerate(packed_ids) if isinstance(packed, str)},
+                **columns
+            }
+        try:
+            os.makedirs(path, exist_ok=True)
+            for name, array in zip(_files, (vectors, codes, ids)):
+                _write_atomic(os.path.join(path, name), lambda f, array=array: np.save(f, array))
+            _write_atomic(os.path.join(path, "index.json"), lambda f: f.write(json.dumps(manifest).encode()))
+        except OSError as e:
+            print(f"Error saving similarity index to {path}: {e}")
+
+    @classmethod
+    def load(cls, path=None):
+        """Open a saved index with its arrays memory-mapped; empty if there's none or it's out of date"""
+        path = path or index_dir
+        try:
+            with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["features"] != list(FEATURES):
+                print("Warning: similarity index was built for different features, rebuilding")
+                return cls()
+            index = cls(manifest["bits"])
+            count = manifest["count"]
+            vectors, codes, ids = (np.load(os.path.join(path, name), mmap_mode="r") for name in _files)
+            index._vectors, index._codes = vectors[:count], np.asarray(codes[:count], dtype=np.int64)
+            packed_ids = [high << 64 | low for high, low in ids[:count].tolist()]
+            for row, uri in manifest["uris"].items():
+                packed_ids[int(row)] = uri
+            index._table = _TrackList(packed_ids, {name: manifest[name][:count] for name in _columns})
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading similarity index from {path}: {e}")
+            return cls()
+        index._order = np.argsort(index._codes, kind="stable")
+        index._sorted_codes = index._codes[index._order]
+        return index
+
+    @classmethod
+    def mapped(cls, bits, vectors, codes, order, sorted_codes, table):
+        """
+        Index over arrays that are already in memory or mapped (see shared_index):
+        `order` is the stable argsort of `codes`, `sorted_codes` is codes[order], and
+        `table` gives each row's Track through record(row) and row_of(packed ID).
+        """
+        index = cls(bits)
+        index._vectors, index._codes = vectors, codes
+        index._order, index._sorted_codes = order, sorted_codes
+        index._table = table
+        return index
+
+
+def _packed(track):
+    """Packed ID of a Track, a URI or an already packed ID"""
+    if isinstance(track, Track):
+        return track.packed_id
+    return pack_uri(track) if isinstance(track, str) else track
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+_index = None
+_index_lock = threading.Lock()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def get_index():
+    """
+    The shared data plane's index if one has been built (see shared_index), otherwise the
+    process-wide one: the saved index memory-mapped, plus any mood index tracks not in it yet.
+    """
+    global _index
+    plane = shared_index.get_plane()
+    if plane is not None:
+        return plane.similarity()
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex.load(index_dir) if index_dir else SimilarityIndex()
+            _index.sync()
+        return _index
+
+
+def query_tags(query):
+    """The emotion_genres tags a search query names as whole words ("sad acoustic covers" names "sad acoustic")"""
+    query = " ".join(query.lower().split())
+    return [tag for tag in TAGS if re.search(rf"(?<!\w){re.escape(tag)}(?!\w)", query)]
+
+
+def add_search_results(query, tracks):
+    """
+    Index search results not seen before under the tags their query names, so tracks from
+    one search embed alike; returns how many were added (none if the query names no tag).
+    """
+    tags = query_tags(query)
+    if not tags:
+        return 0
+    index = get_index()
+    tracks = [track for track in tracks if track not in index]
+    if not tracks:
+        return 0
+    vector = embed(dict.fromkeys(tags, 1.0))
+    return index.add_many(tracks, np.tile(vector, (len(tracks), 1)))
+
+
+def start_background_warm():
+    """Load and sync the index in a daemon thread, so the first lookup isn't paid for in a user's click"""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=get_index, name="emotunes-similarity-warm", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def is_indexed(track):
+    return track in get_index()
+
+
+def more_like_this(track, limit=10):
+    """Tracks similar to `track` from the local index; no API calls"""
+    return get_index().similar(track, limit)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Build and query the track similarity index")
+    parser.add_argument("--index", default=index_dir, help="index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="add mood index tracks to the saved index")
+    build.add_argument("--bits", type=int, default=default_bits)
+    build.add_argument("--rebuild", action="store_true", help="start from scratch instead of the saved index")
+    query = commands.add_parser("query", help="show the tracks most like a track")
+    query.add_argument("uri")
+    query.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = SimilarityIndex(args.bits) if args.rebuild else SimilarityIndex.load(args.index)
+        added = index.sync()
+        index.save(args.index)
+        print(f"Indexed {added} tracks into {args.index}")
+    else:
+        index = SimilarityIndex.load(args.index)
+        start = time.perf_counter()
+        tracks = index.similar(args.uri, args.limit)
+        elapsed = time.perf_counter() - start
+        for track in tracks:
+            print(f"{track.name} - {track.artist}  {track.url}")
+        print(f"{len(tracks)} of {len(index)} tracks in {elapsed * 1000:.2f} ms")
@@ -0,0 +1,300 @@
+"""
+Asyncio counterpart of the spotify_module API.
+
+    results = await spotify_async.search_tracks("daft punk")
+    playlists = await spotify_async.get_playlist_for_emotion_and_language("party", "Hindi")
+
+Requests share one pooled httpx.AsyncClient per event loop and go through the same
+rate-limit scheduler and caches as the sync API, so one worker can keep hundreds of
+requests in flight without a thread each. app.py keeps using the synchronous
+functions in spotify_module.
+"""
+import asyncio
+import base64
+import os
+import time
+import weakref
+
+import httpx
+from spotipy import Spotify
+from spotipy.exceptions import SpotifyException
+
+import spotify_module
+
+max_connections = int(os.getenv("SPOTIFY_ASYNC_MAX_CONNECTIONS", "100"))
+
+# Same retry policy as the sync client's urllib3 Retry (spotify_module._build_session):
+# connection errors and 5xx responses are retried with exponential backoff, while 429s
+# are left to the scheduler
+max_retries = Spotify.max_retries
+retry_backoff = 0.3
+retry_statuses = frozenset(code for code in Spotify.default_retry_codes if code != 429)
+
+# Per event loop: pooled HTTP client, app-token lock and in-flight requests
+_http_clients = weakref.WeakKeyDictionary()
+_token_locks = weakref.WeakKeyDictionary()
+_inflight = weakref.WeakKeyDictionary()
+# Client-credentials token shared by every loop in the process
+_app_token = {}
+
+
+def _http():
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = _http_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=spotify_module.pool_size),
+            timeout=httpx.Timeout(5.0)
+        )
+    return client
+
+
+async def aclose():
+    """Close the pooled HTTP client of the running event loop"""
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _app_access_token():
+    if _app_token and _app_token["expires_at"] - spotify_module.token_expiry_margin > time.time():
+        return _app_token["access_token"]
+    lock = _token_locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+    async with lock:
+        if _app_token and _app_token["expires_at"] - spotify_module.token_expiry_margin > time.time():
+            return _app_token["access_token"]
+        config = spotify_module.get_config()
+        credentials = f"{config['client_id']}:{config['client_secret']}".encode()
+        response = await _http().post(
+            config["token_url"],
+            data={"grant_type": "client_credentials"},
+            headers={"Authorization": "Basic " + base64.b64encode(credentials).decode()}
+        )
+        response.raise_for_status()
+        token_info = response.json()
+        _app_token.update(access_token=token_info["access_token"],
+                          expires_at=time.time() + token_info["expires_in"])
+        return token_info["access_token"]
+
+
+async def _request(method, path, token_info=None, params=None, payload=None):
+    """One Web API call through the shared scheduler; raises SpotifyException on HTTP errors"""
+    async def send():
+        token = token_info["access_token"] if token_info else await _app_access_token()
+        for attempt in range(max_retries + 1):
+            try:
+                response = await _http().request(
+                    method, spotify_module.get_config()["api_url"] + path, params=params, json=payload,
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if attempt == max_retries:
+                    raise
+            else:
+                if response.status_code not in retry_statuses or attempt == max_retries:
+                    break
+            await asyncio.sleep(retry_backoff * 2 ** attempt)
+        if response.status_code >= 400:
+            try:
+                msg = response.json().get("error", {}).get("message")
+            except ValueError:
+                msg = response.text or None
+            raise SpotifyException(response.status_code, -1, f"{response.url}:\n {msg}",
+                                   headers=response.headers)
+        return response.json() if response.content else None
+
+    return await spotify_module.scheduler.call_async(
+        spotify_module.get_config()["client_id"], send, section=spotify_module._call_section(method, path)
+    )
+
+
+async def _coalesced(key, make_request):
+    """Join an identical request already in flight on this loop instead of sending another"""
+    tasks = _inflight.setdefault(asyncio.get_running_loop(), {})
+    task = tasks.get(key)
+    if task is None:
+        task = tasks[key] = asyncio.ensure_future(make_request())
+        task.add_done_callback(lambda _: tasks.pop(key, None))
+    # Shielded so one caller giving up doesn't cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+async def search_tracks(query, token_info=None, limit=10):
+    """Search for tracks and artists, answering repeated queries from the shared cache"""
+    cached = spotify_module.search_cache.get(query, limit)
+    if cached is None:
+        cached = spotify_module._disk_search_results(query, limit)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        results = await _request("GET", "search", token_info,
+                                 params={"q": query, "type": "track,artist", "limit": limit})
+        found = {
+            'tracks': [spotify_module._track_summary(track)
+                       for track in results.get('tracks', {}).get('items', [])],
+            'artists': [spotify_module._artist_summary(artist)
+                        for artist in results.get('artists', {}).get('items', [])]
+        }
+        spotify_module._store_search_results(query, limit, found)
+        return found
+
+    try:
+        found = await _coalesced(("search", spotify_module.normalize_query(query), limit), fetch)
+        return {name: list(items) for name, items in found.items()}
+    except Exception as e:
+        print(f"Error searching: {e}")
+        return {'tracks': [], 'artists': []}
+
+
+async def _fetch_playlists(emotion, language, token_info=None):
+    queries = spotify_module._playlist_search_queries(emotion, language)
+    playlists = []
+    seen = spotify_module.UriSet(kind="playlist")
+    if not await _search_playlists(playlists, seen, queries, token_info):
+        # Still short of the target: the next page of every query, again all at once, like the sync API
+        await _search_playlists(playlists, seen, queries, token_info, offset=spotify_module.playlist_search_limit)
+    return playlists
+
+
+async def _search_playlists(playlists, seen, queries, token_info=None, offset=0):
+    """Send one playlist search per query at once and merge in query order; True once the target is met"""
+    searches = [asyncio.ensure_future(_request("GET", "search", token_info,
+                                               params={"q": query, "type": "playlist", "offset": offset,
+                                                       "limit": spotify_module.playlist_search_limit}))
+                for query in queries]
+    try:
+        # Once the target is met the remaining searches are cancelled
+        for query, search in zip(queries, searches):
+            try:
+                results = await search
+            except Exception as e:
+                print(f"Warning: Error in search query '{query}': {str(e)}")
+                continue
+            if spotify_module._merge_playlists(playlists, results, seen):
+                return True
+    finally:
+        for search in searches:
+            search.cancel()
+    return False
+
+
+async def get_playlist_for_emotion_and_language(emotion, language, genre=None, token_info=None):
+    """
+    Fetch playlists based on emotion and language, served from the shared caches when possible.
+    Stale entries are returned immediately and refreshed in the background, as in the sync API.
+    """
+    key = spotify_module._playlist_cache_key(emotion, language, genre)
+    playlists = spotify_module._cached_playlists(key, emotion, language, genre)
+    if playlists is None:
+        try:
+            playlists = await _coalesced(("playlists",) + key,
+                                         lambda: _fetch_playlists(emotion, language, token_info))
+        except Exception as e:
+            print(f"Error in playlist search: {str(e)}")
+            return []
+        if playlists:
+            spotify_module._store_playlists(key, playlists)
+    return list(playlists) if playlists else []
+
+
+async def create_playlist(user_id, name, description, token_info):
+    """Create a new playlist for the user"""
+    try:
+        return await _request("POST", f"users/{user_id}/playlists", token_info,
+                              payload={"name": name, "public": True, "collaborative": False,
+                                       "description": description})
+    except Exception as e:
+        print(f"Error creating playlist: {e}")
+        return None
+
+
+async def add_tracks_to_playlist(playlist_id, track_uris, token_info,
+                                 chunk_size=spotify_module.playlist_chunk_size):
+    """
+    Add tracks to a playlist in chunks of up to 100, preserving their order.
+    Chunks are written in sequence and a failed chunk is retried in place
+    before moving on.
+    Returns {'ok': bool, 'added': int, 'chunks': [...]} like the sync version.
+    """
+    chunks = []
+    for index, offset in enumerate(range(0, len(track_uris), chunk_size)):
+        uris = track_uris[offset:offset + chunk_size]
+        chunk = {"index": index, "offset": offset, "size": len(uris), "ok": False, "attempts": 0, "error": None}
+        chunks.append(chunk)
+        for attempt in range(spotify_module.chunk_retries + 1):
+            chunk["attempts"] += 1
+            try:
+                # Earlier chunks are settled before this one is sent, so appending keeps the order
+                await _request("POST", f"playlists/{playlist_id}/items", token_info, payload=uris)
+                chunk["ok"], chunk["error"] = True, None
+                break
+            except Exception as e:
+                print(f"Error adding tracks {offset}-{offset + len(uris) - 1}: {e}")
+                chunk["error"] = str(e)
+                if not spotify_module._is_retryable(e):
+                    break
+                await asyncio.sleep(spotify_module.chunk_retry_backoff * 2 ** attempt)
+    return {
+        "ok": all(chunk["ok"] for chunk in chunks),
+        "added": sum(chunk["size"] for chunk in chunks if chunk["ok"]),
+        "chunks": chunks
+    }
+
+
+async def get_saved_status(track_uris, token_info):
+    """Return {uri: saved?} for the user's library, checking uncached tracks in concurrent pages"""
+    if not token_info:
+        return dict.fromkeys(track_uris, False)
+    owner = token_info["access_token"]
+    status = {}
+    unknown = []
+    for uri in dict.fromkeys(track_uris):
+        saved = spotify_module.saved_status_cache.get((owner, uri))
+        if saved is None:
+            unknown.append(uri)
+        else:
+            status[uri] = saved
+
+    pages = spotify_module._pages(unknown, spotify_module.library_page_size)
+    responses = await asyncio.gather(
+        *(_request("GET", "me/library/contains", token_info, params={"uris": ",".join(page)})
+          for page in pages),
+        return_exceptions=True
+    )
+    for page, response in zip(pages, responses):
+        if isinstance(response, Exception):
+            print(f"Error checking saved tracks: {response}")
+            continue
+        for uri, saved in zip(page, response):
+            status[uri] = saved
+            spotify_module.saved_status_cache.set((owner, uri), saved)
+    return status
+
+
+async def save_tracks_to_library(track_uris, token_info):
+    """Save tracks to the user's library in concurrent pages, skipping ones already saved"""
+    status = await get_saved_status(track_uris, token_info)
+    if not token_info:
+        return status
+    owner = token_info["access_token"]
+    pages = spotify_module._pages([uri for uri in dict.fromkeys(track_uris) if not status.get(uri)],
+                                  spotify_module.library_page_size)
+    responses = await asyncio.gather(
+        *(_request("PUT", "me/library", token_info, params={"uris": ",".join(page)}) for page in pages),
+        return_exceptions=True
+    )
+    for page, response in zip(pages, responses):
+        if isinstance(response, Exception):
+            print(f"Error saving tracks: {response}")
+            continue
+        for uri in page:
+            status[uri] = True
+            spotify_module.saved_status_cache.set((owner, uri), True)
+    return status
+
+
+async def save_track_to_library(track_uri, token_info):
+    """Save a track to user's Spotify library"""
+    return (await save_tracks_to_library([track_uri], token_info)).get(track_uri, False)
@@ -0,0 +1,453 @@
+"""
+Caches for Spotify API results.
+
+The in-process caches live at module level so every Streamlit session in a worker
+process shares them; DiskCache is a persistent second tier shared by all workers.
+
+Inspect and maintain the disk cache from the command line:
+
+    python spotify_cache.py stats
+    python spotify_cache.py list [namespace]
+    python spotify_cache.py prune
+    python spotify_cache.py compact
+    python spotify_cache.py warm --queries queries.txt
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with TTL expiry and stale-while-revalidate.
+
+    Entries younger than `ttl` are fresh. Entries between `ttl` and `ttl + stale_ttl`
+    are served as-is while a background refresh replaces them. Older entries are dropped.
+    """
+
+    def __init__(self, maxsize=256, ttl=600, stale_ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0,
+            "expirations": 0, "refreshes": 0, "refresh_errors": 0
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def _lookup(self, key):
+        """Return (value, state) where state is 'fresh', 'stale' or None; caller holds the lock"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None, None
+        value, stored_at = entry
+        age = self._clock() - stored_at
+        if age >= self.ttl + self.stale_ttl:
+            del self._data[key]
+            self.stats["expirations"] += 1
+            return None, None
+        self._data.move_to_end(key)
+        return value, "fresh" if age < self.ttl else "stale"
+
+    def get(self, key, default=None):
+        """Return a cached value (fresh or stale) without loading"""
+        with self._lock:
+            value, state = self._lookup(key)
+            if state is None:
+                self.stats["misses"] += 1
+                return default
+            self.stats["hits" if state == "fresh" else "stale_hits"] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, self._clock())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def get_or_refresh(self, key, refresh):
+        """
+        Return the cached value for key, or None on a miss. Stale values are
+        returned immediately and refreshed in the background with refresh().
+        """
+        with self._lock:
+            value, state = self._lookup(key)
+            if state == "fresh":
+                self.stats["hits"] += 1
+                return value
+            if state == "stale":
+                self.stats["stale_hits"] += 1
+                if key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key, refresh), daemon=True).start()
+                return value
+            self.stats["misses"] += 1
+            return None
+
+    def get_or_load(self, key, loader, refresh=None):
+        """
+        Return the cached value for key, calling loader() on a miss.
+        Stale values are returned immediately and refreshed in the background
+        with refresh() (defaults to loader). A loader result of None is not cached.
+        """
+        value = self.get_or_refresh(key, refresh or loader)
+        if value is not None:
+            return value
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+            with self._lock:
+                self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"Warning: Background cache refresh failed for {key}: {e}")
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the fetch,
+    later callers wait for it and share its result or its exception.
+    """
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0, "timeouts": 0}
+
+    def do(self, key, fn, timeout=None):
+        """Return fn() for key, joining an identical call already in flight"""
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout if timeout is None else timeout):
+                with self._lock:
+                    self.stats["timeouts"] += 1
+                raise TimeoutError(f"Timed out waiting for in-flight request {key!r}")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def normalize_query(query):
+    """Case-fold and collapse whitespace so equivalent queries share a cache entry"""
+    return " ".join(query.casefold().split())
+
+
+def estimate_size(value):
+    """Approximate memory footprint of nested dicts, lists, slotted records and strings in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(type(value), "__slots__") and not isinstance(value, str):
+        size += sum(estimate_size(getattr(value, name)) for name in type(value).__slots__)
+    return size
+
+
+def slice_results(value, cached_limit, limit):
+    """
+    Answer a search for `limit` results from results fetched with `cached_limit`.
+    Returns None when the cached results can't cover the request.
+    """
+    complete = all(len(items) < cached_limit for items in value.values())
+    if limit > cached_limit and not complete:
+        return None
+    return {name: items[:limit] for name, items in value.items()}
+
+
+class QueryCache:
+    """
+    Byte-bounded LRU cache for search results keyed by normalized query text.
+
+    Values are dicts of result lists (e.g. {'tracks': [...], 'artists': [...]}).
+    An entry fetched with a larger limit also answers smaller limits by slicing,
+    and answers larger limits too when every list came back short (the results are complete).
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, ttl=600, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # normalized query -> (value, limit, size, stored_at)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def _drop(self, key):
+        _, _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, query, limit):
+        """Return results for query sliced to limit, or None on a miss"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._clock() - entry[3] >= self.ttl:
+                self._drop(key)
+                self.stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            value, cached_limit, _, _ = entry
+            results = slice_results(value, cached_limit, limit)
+            if results is None:
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return results
+
+    def set(self, query, limit, value):
+        key = normalize_query(query)
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                # Keep a fresh entry that already covers a larger limit
+                if entry[1] > limit and self._clock() - entry[3] < self.ttl:
+                    return
+                self._drop(key)
+            self._data[key] = (value, limit, size, self._clock())
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            for name in self.stats:
+                self.stats[name] = 0
+
+
+class DiskCache:
+    """
+    Persistent SQLite cache tier shared by every worker process on the host.
+
+    Uses WAL mode so readers never block each other, with a busy timeout for
+    concurrent writers. Values are stored as JSON with an absolute expiry time.
+    Storage errors are reported and treated as misses; the disk tier never
+    fails a request.
+    """
+
+    def __init__(self, path, ttl=86400, timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS entries (
+                            namespace TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            value TEXT NOT NULL,
+                            expires_at REAL NOT NULL,
+                            updated_at REAL NOT NULL,
+                            PRIMARY KEY (namespace, key)
+                        ) WITHOUT ROWID
+                    """)
+                    conn.execute("CREATE INDEX IF NOT EXISTS entries_expiry ON entries (expires_at)")
+                    self._initialized = True
+        return conn
+
+    def get(self, namespace, key):
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Disk cache read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + (self.ttl if ttl is None else ttl), now)
+            )
+        except sqlite3.Error as e:
+            print(f"Warning: Disk cache write failed: {e}")
+
+    def delete(self, namespace, key):
+        try:
+            self._connect().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            print(f"Warning: Disk cache delete failed: {e}")
+
+    def entries(self, namespace=None):
+        """Yield (namespace, key, expires_at, updated_at, value_bytes) for every entry"""
+        sql = "SELECT namespace, key, expires_at, updated_at, length(value) FROM entries"
+        args = ()
+        if namespace:
+            sql += " WHERE namespace = ?"
+            args = (namespace,)
+        yield from self._connect().execute(sql + " ORDER BY namespace, key", args)
+
+    def stats(self):
+        rows = self._connect().execute(
+            "SELECT namespace, count(*), sum(expires_at <= ?), sum(length(value)) "
+            "FROM entries GROUP BY namespace",
+            (time.time(),)
+        ).fetchall()
+        return {
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "namespaces": {ns: {"entries": n, "expired": expired, "value_bytes": size}
+                           for ns, n, expired, size in rows}
+        }
+
+    def prune(self):
+        """Delete expired entries, returning how many were removed"""
+        cursor = self._connect().execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def compact(self):
+        """Prune, then rebuild the database file to reclaim space"""
+        removed = self.prune()
+        conn = self._connect()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+        return removed
+
+
+def _warm(args):
+    # Imported here so the cache module never depends on spotify_module at import time
+    import spotify_module
+
+    emotions = args.emotions or list(spotify_module.emotion_genres)
+    languages = args.languages or list(spotify_module.language_queries)
+    for emotion in emotions:
+        for language in languages:
+            playlists = spotify_module.get_playlist_for_emotion_and_language(emotion, language)
+            print(f"{emotion} / {language}: {len(playlists)} playlists")
+    if args.queries:
+        with open(args.queries) as f:
+            for query in filter(None, (line.strip() for line in f)):
+                results = spotify_module.search_tracks(query)
+                print(f"'{query}': {len(results['tracks'])} tracks")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain the EmoTunes disk cache")
+    parser.add_argument("--db", default=os.getenv("EMOTUNES_CACHE_DB", ".emotunes_cache.sqlite"),
+                        help="path to the SQLite cache file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show entry counts and sizes")
+    list_parser = commands.add_parser("list", help="list cached entries")
+    list_parser.add_argument("namespace", nargs="?")
+    commands.add_parser("prune", help="delete expired entries")
+    commands.add_parser("compact", help="delete expired entries and vacuum the file")
+    warm_parser = commands.add_parser("warm", help="pre-populate the cache from the Spotify API")
+    warm_parser.add_argument("--emotions", nargs="*")
+    warm_parser.add_argument("--languages", nargs="*")
+    warm_parser.add_argument("--queries", help="file with one search query per line")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        os.environ["EMOTUNES_CACHE_DB"] = args.db
+        _warm(args)
+        return
+
+    cache = DiskCache(args.db)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == "list":
+        now = time.time()
+        for namespace, key, expires_at, updated_at, size in cache.entries(args.namespace):
+            state = "expired" if expires_at <= now else f"expires in {int(expires_at - now)}s"
+            print(f"{namespace}\t{key}\t{size} bytes\t{state}")
+    elif args.command == "prune":
+        print(f"Removed {cache.prune()} expired entries")
+    elif args.command == "compact":
+        print(f"Removed {cache.compact()} expired entries and compacted {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,203 @@
+import contextvars
+import json
 import os
-from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth
-from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-load_dotenv()
+from spotify_cache import TTLCache, QueryCache, DiskCache, SingleFlight, normalize_query, slice_results
+from spotify_scheduler import RequestScheduler, background
+from records import (
+    Track, Artist, Playlist, UriSet, merge_unique, to_json, search_results_from_json, playlists_from_json
+)
 
-client_id = os.getenv("SPOTIPY_CLIENT_ID")
-client_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
-redirect_uri = os.getenv("SPOTIPY_REDIRECT_URI")  # Add this to your .env file, e.g. "http://localhost:8501/"
-
-if not client_id or not client_secret or not redirect_uri:
-    raise ValueError("Spotify client ID, secret or redirect URI not found in .env.")
+# Importing this module does no I/O and builds no clients: spotipy, requests and the
+# .env file are only loaded on first use, so workers and tests start fast and don't
+# need Spotify credentials until they actually talk to Spotify.
 
 # Enhanced scope for more features
 scope = "playlist-read-private playlist-modify-public playlist-modify-private user-read-playback-state user-modify-playback-state streaming user-library-read user-library-modify"
 
-# Initialize SpotifyOAuth for user authorization
-sp_oauth = SpotifyOAuth(client_id=client_id,
-                       client_secret=client_secret,
-                       redirect_uri=redirect_uri,
-                       scope=scope)
+@lru_cache(maxsize=None)
+def get_config():
+    """Load Spotify credentials and endpoints from the environment (and .env) on first use"""
+    from dotenv import load_dotenv
+    load_dotenv()
 
-# This function gets a Spotify client with a valid user token, given the token info
-def get_spotify_client(token_info=None):
+    config = {
+        "client_id": os.getenv("SPOTIPY_CLIENT_ID"),
+        "client_secret": os.getenv("SPOTIPY_CLIENT_SECRET"),
+        "redirect_uri": os.getenv("SPOTIPY_REDIRECT_URI"),  # Add this to your .env file, e.g. "http://localhost:8501/"
+        # Spotify endpoints (overridable so tests and benchmarks can point at a local stand-in)
+        "api_url": os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1/"),
+        "token_url": os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+    }
+    if not config["client_id"] or not config["client_secret"] or not config["redirect_uri"]:
+        raise ValueError("Spotify client ID, secret or redirect URI not found in .env.")
+    return config
+
+@lru_cache(maxsize=None)
+def get_oauth_manager():
+    """SpotifyOAuth manager for user authorization, created on first use"""
+    from spotipy.oauth2 import SpotifyOAuth
+
+    config = get_config()
+    sp_oauth = SpotifyOAuth(client_id=config["client_id"],
+                           client_secret=config["client_secret"],
+                           redirect_uri=config["redirect_uri"],
+                           scope=scope)
+    sp_oauth.OAUTH_TOKEN_URL = config["token_url"]
+    return sp_oauth
+
+def __getattr__(name):
+    # Lazy module attributes kept for callers that used the old import-time globals
+    if name == "sp_oauth":
+        return get_oauth_manager()
+    if name in ("client_id", "client_secret", "redirect_uri", "api_url", "token_url"):
+        return get_config()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Connection pool settings for the shared HTTP sessions
+pool_size = int(os.getenv("SPOTIFY_POOL_SIZE", "20"))
+max_clients = int(os.getenv("SPOTIFY_MAX_CLIENTS", "256"))
+# Evict user clients this many seconds before their token actually expires
+token_expiry_margin = 60
+
+# Every API call goes through this scheduler: a token bucket per app credential,
+# interactive calls ahead of background ones, and Retry-After handling for 429s
+scheduler = RequestScheduler(
+    rate=float(os.getenv("SPOTIFY_RATE_LIMIT", "10")),
+    burst=int(os.getenv("SPOTIFY_RATE_BURST", "20")),
+    max_retries=int(os.getenv("SPOTIFY_RATE_LIMIT_RETRIES", "4")),
+    interactive_timeout=float(os.getenv("SPOTIFY_INTERACTIVE_TIMEOUT", "10"))
+)
+
+@lru_cache(maxsize=None)
+def _scheduled_spotify_class():
+    """Spotify client class whose API calls are all routed through the shared scheduler"""
+    from spotipy import Spotify
+
+    class ScheduledSpotify(Spotify):
+        def _internal_call(self, method, url, payload, params):
+            # _internal_call consumes params, so each attempt gets its own copy
+            return scheduler.call(
+                get_config()["client_id"],
+                lambda: super(ScheduledSpotify, self)._internal_call(method, url, payload, dict(params)),
+                section=_call_section(method, url)
+            )
+
+    return ScheduledSpotify
+
+def _call_section(method, url):
+    """Profiling section for an API call, e.g. "spotify GET /search"; IDs are left out to keep the label set small"""
+    path = url.split("?")[0].split("/v1/", 1)[-1]
+    return f"spotify {method} /{path.strip('/').split('/')[0]}"
+
+# Registry of live clients: identity -> {"client", "session", "expires_at"}
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+def _build_session():
+    """Create a keep-alive requests session with a tuned connection pool"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from spotipy import Spotify
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(
+        total=Spotify.max_retries,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=Spotify.max_retries,
+        backoff_factor=0.3,
+        # 429s are left to the scheduler so Retry-After is shared by every caller; urllib3
+        # would otherwise retry any response carrying Retry-After itself, in this thread only
+        status_forcelist=[code for code in Spotify.default_retry_codes if code != 429],
+        respect_retry_after_header=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _client_identity(token_info):
+    """Key a client by the user's access token, or by the app credentials"""
     if token_info:
-        access_token = token_info["access_token"]
-        return Spotify(auth=access_token)
+        return ("user", token_info["access_token"])
+    return ("app", get_config()["client_id"])
+
+def _new_client(token_info, session):
+    config = get_config()
+    ScheduledSpotify = _scheduled_spotify_class()
+    if token_info:
+        client = ScheduledSpotify(auth=token_info["access_token"], requests_session=session)
     else:
-        # fallback to client credentials flow if no token
+        from spotipy.cache_handler import MemoryCacheHandler
         from spotipy.oauth2 import SpotifyClientCredentials
-        return Spotify(auth_manager=SpotifyClientCredentials(client_id=client_id, client_secret=client_secret))
+
+        # Client credentials flow; the manager keeps its token in memory and refreshes it on expiry
+        auth_manager = SpotifyClientCredentials(
+            client_id=config["client_id"],
+            client_secret=config["client_secret"],
+            requests_session=session,
+            cache_handler=MemoryCacheHandler()
+        )
+        auth_manager.OAUTH_TOKEN_URL = config["token_url"]
+        client = ScheduledSpotify(auth_manager=auth_manager, requests_session=session)
+    client.prefix = config["api_url"]
+    return client
+
+def _evict(identity, close=False):
+    entry = _clients.pop(identity, None)
+    # Other threads may still be mid-request on an evicted client, so by default its
+    # connections are left to close when the session is garbage collected
+    if entry and close:
+        entry["session"].close()
+
+def _evict_expired(now, requested=None):
+    """
+    Drop clients whose token expires within token_expiry_margin. The requested identity is
+    kept until its token has actually expired: a caller still passing that token would
+    otherwise get a new client (and session) on every call.
+    """
+    expired = [identity for identity, entry in _clients.items()
+               if entry["expires_at"] is not None
+               and entry["expires_at"] - (0 if identity == requested else token_expiry_margin) <= now]
+    for identity in expired:
+        _evict(identity)
+
+# This function gets a Spotify client with a valid user token, given the token info.
+# Clients are pooled per identity so repeated calls reuse the same connections and app token.
+def get_spotify_client(token_info=None):
+    identity = _client_identity(token_info)
+    now = time.time()
+    with _clients_lock:
+        _evict_expired(now, identity)
+        entry = _clients.get(identity)
+        if entry is None:
+            session = _build_session()
+            entry = {
+                "client": _new_client(token_info, session),
+                "session": session,
+                "expires_at": token_info.get("expires_at") if token_info else None
+            }
+            _clients[identity] = entry
+            # Drop the least recently used identities once the registry is full
+            while len(_clients) > max_clients:
+                _evict(next(iter(_clients)))
+        else:
+            _clients.move_to_end(identity)
+        return entry["client"]
+
+def clear_spotify_clients():
+    """Close every pooled client and its connections"""
+    with _clients_lock:
+        for identity in list(_clients):
+            _evict(identity, close=True)
 
 # Emotion to genres mapping with more detailed categories
 emotion_genres = {
@@ -85,32 +253,81 @@ emotion_genres = {
     ]
 }
 
+# Identical requests already in flight (from any session) are joined rather than repeated
+inflight = SingleFlight(timeout=float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30")))
+
+# Shared cache for search box queries, bounded by memory rather than entry count
+search_cache = QueryCache(
+    max_bytes=int(os.getenv("SEARCH_CACHE_BYTES", str(8 * 1024 * 1024))),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "600"))
+)
+
 def search_tracks(query, token_info=None, limit=10):
-    """Search for tracks and artists"""
-    sp = get_spotify_client(token_info)
+    """Search for tracks and artists, answering repeated queries from the shared cache"""
+    cached = search_cache.get(query, limit)
+    if cached is not None:
+        return cached
+
     try:
-        results = sp.search(q=query, type='track,artist', limit=limit)
-        tracks = results.get('tracks', {}).get('items', [])
-        artists = results.get('artists', {}).get('items', [])
-        
-        return {
-            'tracks': [{
-                'name': track['name'],
-                'artist': track['artists'][0]['name'],
-                'url': track['external_urls']['spotify'],
-                'uri': track['uri'],
-                'preview_url': track['preview_url']
-            } for track in tracks],
-            'artists': [{
-                'name': artist['name'],
-                'url': artist['external_urls']['spotify'],
-                'uri': artist['uri']
-            } for artist in artists]
-        }
+        # Concurrent identical searches share one fetch
+        found = inflight.do(
+            ("search", normalize_query(query), limit),
+            lambda: _load_search_results(query, limit, token_info)
+        )
+        return {name: list(items) for name, items in found.items()}
     except Exception as e:
         print(f"Error searching: {e}")
         return {'tracks': [], 'artists': []}
 
+def _load_search_results(query, limit, token_info=None):
+    """Load search results from the disk tier, falling back to the API; errors propagate"""
+    results = _disk_search_results(query, limit)
+    if results is not None:
+        return results
+
+    sp = get_spotify_client(token_info)
+    results = sp.search(q=query, type='track,artist', limit=limit)
+    tracks = results.get('tracks', {}).get('items', [])
+    artists = results.get('artists', {}).get('items', [])
+
+    found = {
+        'tracks': [_track_summary(track) for track in tracks],
+        'artists': [_artist_summary(artist) for artist in artists]
+    }
+    _store_search_results(query, limit, found)
+    return found
+
+def _disk_search_results(query, limit):
+    """
+    Results persisted by this or another worker process (the second tier), sliced to
+    limit and put back in memory; None if they're missing or cover fewer results.
+    Shared by the sync and async APIs.
+    """
+    if not disk_cache:
+        return None
+    stored = disk_cache.get("search", normalize_query(query))
+    if not stored:
+        return None
+    stored_results = search_results_from_json(stored["results"])
+    results = slice_results(stored_results, stored["limit"], limit)
+    if results is not None:
+        search_cache.set(query, stored["limit"], stored_results)
+    return results
+
+def _store_search_results(query, limit, found):
+    search_cache.set(query, limit, found)
+    if disk_cache:
+        disk_cache.set("search", normalize_query(query), {"limit": limit, "results": to_json(found)})
+
+def _track_summary(track):
+    return Track.from_api(track)
+
+def _artist_summary(artist):
+    return Artist.from_api(artist)
+
+def _playlist_summary(playlist):
+    return Playlist.from_api(playlist)
+
 def create_playlist(user_id, name, description, token_info):
     """Create a new playlist for the user"""
     sp = get_spotify_client(token_info)
@@ -126,79 +343,375 @@ def create_playlist(user_id, name, description, token_info):
         print(f"Error creating playlist: {e}")
         return None
 
-def add_tracks_to_playlist(playlist_id, track_uris, token_info):
-    """Add tracks to a playlist"""
+# The Web API accepts at most 100 items per playlist add request
+playlist_chunk_size = 100
+# Extra passes over chunks that failed, with exponential backoff between passes
+chunk_retries = 3
+chunk_retry_backoff = 0.5
+# Status codes worth retrying; other client errors fail the chunk immediately
+retryable_statuses = (429, 500, 502, 503, 504)
+
+def _is_retryable(error):
+    status = getattr(error, "http_status", None)
+    return status is None or status in retryable_statuses
+
+def add_tracks_to_playlist(playlist_id, track_uris, token_info, chunk_size=playlist_chunk_size):
+    """
+    Add tracks to a playlist in chunks of up to 100, preserving their order.
+
+    Chunks are written one after another over the pooled connection. A chunk that
+    fails is retried later and inserted back at its original position.
+    Returns {'ok': bool, 'added': int, 'chunks': [...]} with one result per chunk.
+    """
     sp = get_spotify_client(token_info)
+    chunks = [{
+        "index": index,
+        "offset": offset,
+        "size": len(track_uris[offset:offset + chunk_size]),
+        "ok": False,
+        "attempts": 0,
+        "error": None
+    } for index, offset in enumerate(range(0, len(track_uris), chunk_size))]
+
+    def write(chunk, position=None):
+        chunk["attempts"] += 1
+        try:
+            sp.playlist_add_items(playlist_id, track_uris[chunk["offset"]:chunk["offset"] + chunk["size"]],
+                                  position=position)
+            chunk["ok"], chunk["error"] = True, None
+            chunk.pop("retryable", None)
+        except Exception as e:
+            print(f"Error adding tracks {chunk['offset']}-{chunk['offset'] + chunk['size'] - 1}: {e}")
+            chunk["error"] = str(e)
+            chunk["retryable"] = _is_retryable(e)
+
+    # First pass: append every chunk in order
+    for chunk in chunks:
+        write(chunk)
+
+    # Retry passes: put each failed chunk back between the chunks that made it in
+    for attempt in range(chunk_retries):
+        failed = [chunk for chunk in chunks if not chunk["ok"] and chunk.get("retryable", True)]
+        if not failed:
+            break
+        time.sleep(chunk_retry_backoff * 2 ** attempt)
+        try:
+            # Tracks that were already in the playlist come before everything we added
+            total = sp.playlist(playlist_id, fields="tracks.total")["tracks"]["total"]
+        except Exception as e:
+            print(f"Error reading playlist length: {e}")
+            continue
+        existing = total - sum(chunk["size"] for chunk in chunks if chunk["ok"])
+        for chunk in failed:
+            position = existing + sum(c["size"] for c in chunks[:chunk["index"]] if c["ok"])
+            write(chunk, position)
+
+    for chunk in chunks:
+        chunk.pop("retryable", None)
+    return {
+        "ok": all(chunk["ok"] for chunk in chunks),
+        "added": sum(chunk["size"] for chunk in chunks if chunk["ok"]),
+        "chunks": chunks
+    }
+
+# Simplified language mapping
+language_queries = {
+    "English": ["english playlist", "english songs"],
+    "Hindi": ["hindi songs", "bollywood songs"],
+    "Kannada": ["kannada songs", "kannada hits"],
+    "Telugu": ["telugu songs", "tollywood hits"],
+    "Tamil": ["tamil songs", "kollywood hits"]
+}
+
+# How many playlists a recommendation returns, and how many each language query asks for
+playlist_target = int(os.getenv("PLAYLIST_TARGET", "6"))
+playlist_search_limit = int(os.getenv("PLAYLIST_SEARCH_LIMIT", "3"))
+
+# Bounded pool shared by every fan-out request, so a burst of clicks can't spawn unbounded threads
+request_workers = int(os.getenv("SPOTIFY_REQUEST_WORKERS", "8"))
+_request_pool = ThreadPoolExecutor(max_workers=request_workers, thread_name_prefix="spotify-request")
+
+def _submit(fn, *args, **kwargs):
+    """Submit to the request pool, carrying over the caller's request priority"""
+    return _request_pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def _search_in_order(sp, queries, search_type, limit, offset=0):
+    """
+    Run all searches in parallel and yield (query, results, error) in query order.
+    Closing the generator early cancels any searches that haven't started yet.
+    """
+    futures = [_submit(sp.search, q=query, type=search_type, limit=limit, offset=offset) for query in queries]
     try:
-        sp.playlist_add_items(playlist_id, track_uris)
-        return True
-    except Exception as e:
-        print(f"Error adding tracks: {e}")
-        return False
+        for query, future in zip(queries, futures):
+            try:
+                yield query, future.result(), None
+            except Exception as e:
+                yield query, None, e
+    finally:
+        for future in futures:
+            future.cancel()
+
+# Spotify serves search results no deeper than this (offset + limit)
+search_max_results = 1000
+
+def iter_search_pages(query, search_type="track", page_size=10, start=0, max_results=None, token_info=None, sp=None):
+    """
+    Pages (lists of records) of one search, yielded lazily by following Spotify's offset paging.
+
+    The first page is requested as soon as this is called, and each following page is
+    requested in the background while the consumer handles the current one. Paging ends
+    with the last page, at max_results, or when the consumer stops: closing the generator
+    cancels the prefetch. Errors propagate to the consumer.
+    """
+    sp = sp or get_spotify_client(token_info)
+    summary = {"track": _track_summary, "artist": _artist_summary, "playlist": _playlist_summary}[search_type]
+    end = search_max_results if max_results is None else min(search_max_results, start + max_results)
+
+    def fetch(offset):
+        return sp.search(q=query, type=search_type, limit=min(page_size, end - offset), offset=offset)
+
+    def pages(pending, offset):
+        try:
+            while pending is not None:
+                page = pending.result().get(search_type + "s") or {}
+                items = page.get("items") or []
+                offset += len(items)
+                # Request the next page before handing this one over
+                pending = _submit(fetch, offset) if items and page.get("next") and offset < end else None
+                yield [summary(item) for item in items if item]
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    return pages(_submit(fetch, start) if start < end else None, start)
+
+# Persistent second cache tier shared by every worker process; set EMOTUNES_CACHE_DB="" to disable
+cache_db_path = os.getenv("EMOTUNES_CACHE_DB", ".emotunes_cache.sqlite")
+# Seconds a persisted playlist set stays usable, on disk or in the shared data plane
+disk_cache_ttl = float(os.getenv("DISK_CACHE_TTL", "86400"))
+disk_cache = DiskCache(cache_db_path, ttl=disk_cache_ttl) if cache_db_path else None
+
+# Read-only data plane mapped by every worker process (see shared_index); unused until built
+shared_index_path = os.getenv("SHARED_INDEX_PATH", ".emotunes_plane.bin")
+
+# Shared playlist recommendations cache: (emotion, language, genre) -> playlists.
+# Lives at module level so every session in this worker process shares it.
+playlist_cache = TTLCache(
+    maxsize=int(os.getenv("PLAYLIST_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("PLAYLIST_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("PLAYLIST_CACHE_STALE_TTL", "3600"))
+)
+
+def _playlist_cache_key(emotion, language, genre=None):
+    return (emotion.strip().lower(), language.strip().lower(), genre.strip().lower() if genre else None)
 
 def get_playlist_for_emotion_and_language(emotion, language, genre=None, token_info=None):
+    """
+    Fetch playlists based on emotion and language, served from the shared cache when possible.
+    Stale entries are returned immediately and refreshed in the background.
+    """
+    key = _playlist_cache_key(emotion, language, genre)
+    try:
+        playlists = _cached_playlists(key, emotion, language, genre)
+        if playlists is None:
+            # Sessions missing the same combination at once share one fetch
+            playlists = inflight.do(("playlists",) + key, lambda: _load_playlists(key, emotion, language, genre, token_info))
+            if playlists:
+                playlist_cache.set(key, playlists)
+    except Exception as e:
+        print(f"Error in playlist search: {str(e)}")
+        return []
+    return list(playlists) if playlists else []
+
+def refresh_playlist_cache(emotion, language, genre=None):
+    """Refetch one combination at background priority and store it in both cache tiers"""
+    key = _playlist_cache_key(emotion, language, genre)
+    try:
+        playlists = inflight.do(("playlists",) + key, lambda: _refresh_playlists(key, emotion, language, genre))
+    except Exception as e:
+        print(f"Error refreshing playlists: {str(e)}")
+        return []
+    if playlists:
+        playlist_cache.set(key, playlists)
+    return list(playlists) if playlists else []
+
+def _refresh_playlists(key, emotion, language, genre=None):
+    """Refetch playlists at background priority, bypassing the disk tier"""
+    with background():
+        return _load_playlists(key, emotion, language, genre, use_disk=False)
+
+def _cached_playlists(key, emotion, language, genre=None):
+    """
+    Playlists from the tiers in front of the API, in order: memory (stale entries are
+    served and refreshed in the background), disk, the shared data plane. None if none
+    of them has the combination. Shared by the sync and async APIs.
+    """
+    # Playlist search is public, so background refreshes use the app credentials
+    playlists = playlist_cache.get_or_refresh(key, lambda: _refresh_playlists(key, emotion, language, genre))
+    if playlists is None:
+        playlists = _local_playlists(key)
+        if playlists:
+            playlist_cache.set(key, playlists)
+    return playlists
+
+def _local_playlists(key):
+    # The disk tier is written on every fetch, so it's at least as fresh as the last plane build
+    return _disk_playlists(key) or _shared_playlists(key)
+
+def _load_playlists(key, emotion, language, genre=None, token_info=None, use_disk=True):
+    """Load playlists from the disk tier or the shared data plane, falling back to the API; None if nothing was found"""
+    if use_disk:
+        playlists = _local_playlists(key)
+        if playlists:
+            return playlists
+    playlists = _fetch_playlists_for_emotion_and_language(emotion, language, genre, token_info)
+    # Empty results (no matches or API errors) are not cached
+    if not playlists:
+        return None
+    if disk_cache:
+        disk_cache.set("playlists", json.dumps(key), to_json(playlists))
+    return playlists
+
+def _shared_playlists(key):
+    """Playlists from the shared data plane (see shared_index), if one was built within the disk tier's TTL"""
+    if not shared_index_path or not os.path.exists(shared_index_path):
+        return None
+    import shared_index
+
+    plane = shared_index.get_plane()
+    return plane.playlists(key, max_age=disk_cache_ttl) if plane is not None else None
+
+def _disk_playlists(key):
+    """Playlists persisted in the disk tier for a cache key, or None"""
+    if not disk_cache:
+        return None
+    playlists = disk_cache.get("playlists", json.dumps(key))
+    return playlists_from_json(playlists) if playlists else None
+
+def _store_playlists(key, playlists):
+    playlist_cache.set(key, playlists)
+    if disk_cache:
+        disk_cache.set("playlists", json.dumps(key), to_json(playlists))
+
+def _playlist_search_queries(emotion, language):
+    # Get base queries for the selected language
+    base_queries = language_queries.get(language, [language.lower()])
+    return [f"{emotion} {query}" for query in base_queries]
+
+def _merge_playlists(playlists, results, seen):
+    """Append new playlists from one search response; returns True once the target is reached"""
+    items = ((results or {}).get('playlists') or {}).get('items') or []
+    # Basic validation to ensure we have all required fields (the API returns nulls for removed playlists)
+    candidates = [_playlist_summary(playlist) for playlist in items if playlist and 'uri' in playlist]
+    # `seen` holds every URI already merged, so duplicates across queries are skipped in O(1)
+    playlists.extend(merge_unique([candidates], limit=playlist_target - len(playlists), seen=seen))
+    return len(playlists) >= playlist_target
+
+def _fetch_playlists_for_emotion_and_language(emotion, language, genre=None, token_info=None):
     """
     Fetch playlists based on emotion and language with optimized search.
+    All language queries are sent at once; results are merged in query order.
     """
     playlists = []
+    seen = UriSet(kind="playlist")
     sp = get_spotify_client(token_info)
-    
-    # Simplified language mapping
-    language_queries = {
-        "English": ["english playlist", "english songs"],
-        "Hindi": ["hindi songs", "bollywood songs"],
-        "Kannada": ["kannada songs", "kannada hits"],
-        "Telugu": ["telugu songs", "tollywood hits"],
-        "Tamil": ["tamil songs", "kollywood hits"]
-    }
 
-    # Get base queries for the selected language
-    base_queries = language_queries.get(language, [language.lower()])
-    
     try:
         # Make just 2-3 targeted searches instead of many combinations
-        for query in base_queries:
-            search_query = f"{emotion} {query}"
-            try:
-                results = sp.search(q=search_query, type="playlist", limit=3)
-                if results and 'playlists' in results and 'items' in results['playlists']:
-                    playlist_data = results['playlists']['items']
-                    
-                    for playlist in playlist_data:
-                        # Basic validation to ensure we have all required fields
-                        if not playlist or 'uri' not in playlist:
-                            continue
-                            
-                        # Check if playlist is not already added
-                        if not any(p['uri'] == playlist['uri'] for p in playlists):
-                            playlists.append({
-                                "name": playlist.get("name", "Untitled Playlist"),
-                                "url": playlist.get("external_urls", {}).get("spotify", ""),
-                                "uri": playlist["uri"],
-                                "description": playlist.get("description", ""),
-                                "image": playlist.get("images", [{}])[0].get("url") if playlist.get("images") else None
-                            })
-                            
-                        # If we have enough playlists, stop searching
-                        if len(playlists) >= 6:
-                            return playlists
-                            
-            except Exception as e:
-                print(f"Warning: Error in search query '{search_query}': {str(e)}")
+        search_queries = _playlist_search_queries(emotion, language)
+        for search_query, results, error in _search_in_order(sp, search_queries, "playlist", playlist_search_limit):
+            if error:
+                print(f"Warning: Error in search query '{search_query}': {str(error)}")
                 continue
-                
+            # Remaining searches are cancelled when the generator is closed
+            if _merge_playlists(playlists, results, seen):
+                return playlists
+
+        # Still short of the target: the next page of every query, again all at once, so a
+        # click costs at most one more round trip
+        deeper = _search_in_order(sp, search_queries, "playlist", playlist_search_limit, offset=playlist_search_limit)
+        try:
+            for search_query, results, error in deeper:
+                if error:
+                    print(f"Warning: Error paging query '{search_query}': {str(error)}")
+                    continue
+                if _merge_playlists(playlists, results, seen):
+                    break
+        finally:
+            deeper.close()
+
         return playlists
-        
+
     except Exception as e:
         print(f"Error in playlist search: {str(e)}")
         return []
 
+# The Web API checks or saves at most 50 tracks per library request
+library_page_size = 50
+
+# Cached library membership: (access token, track uri) -> saved?
+saved_status_cache = TTLCache(
+    maxsize=int(os.getenv("SAVED_STATUS_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("SAVED_STATUS_CACHE_TTL", "300")),
+    stale_ttl=0
+)
+
+def _pages(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def get_saved_status(track_uris, token_info):
+    """Return {uri: saved?} for the user's library, checking uncached tracks in concurrent 50-track pages"""
+    if not token_info:
+        # The library belongs to a user; without their token nothing can be saved
+        return dict.fromkeys(track_uris, False)
+    owner = token_info["access_token"]
+    status = {}
+    unknown = []
+    for uri in dict.fromkeys(track_uris):
+        saved = saved_status_cache.get((owner, uri))
+        if saved is None:
+            unknown.append(uri)
+        else:
+            status[uri] = saved
+
+    if unknown:
+        sp = get_spotify_client(token_info)
+        pages = _pages(unknown, library_page_size)
+        futures = [_submit(sp.current_user_saved_tracks_contains, page) for page in pages]
+        for page, future in zip(pages, futures):
+            try:
+                for uri, saved in zip(page, future.result()):
+                    status[uri] = saved
+                    saved_status_cache.set((owner, uri), saved)
+            except Exception as e:
+                print(f"Error checking saved tracks: {e}")
+    return status
+
+def save_tracks_to_library(track_uris, token_info):
+    """
+    Save tracks to the user's library in concurrent 50-track pages, skipping ones already saved.
+    Returns {uri: saved?} for every requested track.
+    """
+    status = get_saved_status(track_uris, token_info)
+    if not token_info:
+        return status
+    owner = token_info["access_token"]
+    to_save = [uri for uri in dict.fromkeys(track_uris) if not status.get(uri)]
+
+    if to_save:
+        sp = get_spotify_client(token_info)
+        pages = _pages(to_save, library_page_size)
+        futures = [_submit(sp.current_user_saved_tracks_add, page) for page in pages]
+        for page, future in zip(pages, futures):
+            try:
+                future.result()
+                for uri in page:
+                    status[uri] = True
+                    saved_status_cache.set((owner, uri), True)
+            except Exception as e:
+                print(f"Error saving tracks: {e}")
+    return status
+
 def save_track_to_library(track_uri, token_info):
     """Save a track to user's Spotify library"""
-    sp = get_spotify_client(token_info)
-    try:
-        sp.current_user_saved_tracks_add([track_uri])
-        return True
-    except Exception as e:
-        print(f"Error saving track: {e}")
-        return False 
\ No newline at end of file
+    return save_tracks_to_library([track_uri], token_info).get(track_uri, False)
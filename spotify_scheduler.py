@@ -0,0 +1,245 @@
+"""
+Central scheduler for Spotify Web API requests.
+
+Every API call made by spotify_module passes through RequestScheduler.call (and every
+call made by spotify_async through RequestScheduler.call_async), which:
+  - enforces a client-side token bucket per app credential,
+  - serves interactive requests (the search box, button clicks) before background ones
+    (cache refreshes, prewarming),
+  - honors 429 Retry-After responses with jittered backoff (capped at max_backoff),
+    pausing every caller that shares the throttled credential,
+  - gives interactive calls a deadline, raising RateLimitTimeout rather than hanging
+    a user's script thread behind a long throttle,
+  - times each call, queueing and retries included, under its profiling section.
+"""
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import profiling
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+_priority = contextvars.ContextVar("spotify_request_priority", default=INTERACTIVE)
+# Counter of the enclosing counting() block, if any
+_counter = contextvars.ContextVar("spotify_request_counter", default=None)
+
+
+@contextmanager
+def background():
+    """Run the enclosed Spotify calls at background priority"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def counting():
+    """
+    Count the Spotify calls the enclosed code makes, in this context and ones copied from
+    it (e.g. spotify_module's request pool), but not other callers': yields {"calls": n}.
+    """
+    counter = {"calls": 0}
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+def _check_rate(rate):
+    # A rate of 0 would never refill the bucket (and divides by zero computing the wait)
+    if not rate > 0:
+        raise ValueError(f"Spotify request rate must be positive, got {rate!r}")
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `burst`.
+    Waiters are served strictly by (priority, arrival), so queued interactive
+    requests always get the next token before background ones.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        _check_rate(rate)
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def block_for(self, seconds):
+        """Hand out no tokens for the next `seconds` (e.g. after a 429)"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+            self._cond.notify_all()
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Take one token, waiting as needed; returns False if timeout elapses first"""
+        ticket = (priority, next(self._sequence))
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    if self._waiters[0] == ticket:
+                        if now >= self._blocked_until and self._tokens >= 1:
+                            self._tokens -= 1
+                            return True
+                        wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+                    else:
+                        # Not our turn; the head waiter notifies us when it's served
+                        wait = None
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class RateLimitTimeout(TimeoutError):
+    """An interactive call couldn't be admitted before its deadline"""
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """Routes API calls through per-credential token buckets with 429 handling"""
+
+    def __init__(self, rate=10.0, burst=20, max_retries=4, backoff=0.5, max_backoff=30.0, interactive_timeout=10.0):
+        _check_rate(rate)
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Seconds an interactive call may wait for tokens, retries included (None: no limit)
+        self.interactive_timeout = interactive_timeout
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "background_calls": 0, "timeouts": 0}
+
+    def bucket(self, credential):
+        with self._lock:
+            bucket = self._buckets.get(credential)
+            if bucket is None:
+                bucket = self._buckets[credential] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _admit(self, credential, priority):
+        priority = current_priority() if priority is None else priority
+        self._count("calls")
+        counter = _counter.get()
+        if counter is not None:
+            with self._lock:
+                counter["calls"] += 1
+        if priority == BACKGROUND:
+            self._count("background_calls")
+        return self.bucket(credential), priority
+
+    def _deadline(self, priority):
+        """When an interactive call stops waiting for tokens; None for background calls"""
+        if priority != INTERACTIVE or self.interactive_timeout is None:
+            return None
+        return time.monotonic() + self.interactive_timeout
+
+    def _timed_out(self):
+        self._count("timeouts")
+        return RateLimitTimeout(f"Spotify rate limit: no request slot within {self.interactive_timeout:g}s")
+
+    def call(self, credential, fn, *args, priority=None, section="spotify", **kwargs):
+        """Call fn(*args, **kwargs) once a token is available, retrying 429 responses"""
+        with profiling.section(section):
+            return self._call(credential, fn, args, kwargs, priority)
+
+    def _call(self, credential, fn, args, kwargs, priority):
+        bucket, priority = self._admit(credential, priority)
+        deadline = self._deadline(priority)
+        for attempt in range(self.max_retries + 1):
+            if not bucket.acquire(priority, _remaining(deadline)):
+                raise self._timed_out()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                # Matched by attribute (SpotifyException.http_status) so spotipy isn't imported here
+                if getattr(e, "http_status", None) != 429 or attempt == self.max_retries:
+                    raise
+                self.throttle(credential, e, attempt)
+
+    async def call_async(self, credential, fn, *args, priority=None, section="spotify", **kwargs):
+        """Async counterpart of call() for coroutine functions; never blocks the event loop"""
+        with profiling.section(section):
+            return await self._call_async(credential, fn, args, kwargs, priority)
+
+    async def _call_async(self, credential, fn, args, kwargs, priority):
+        import asyncio
+
+        bucket, priority = self._admit(credential, priority)
+        deadline = self._deadline(priority)
+        for attempt in range(self.max_retries + 1):
+            # Usually a token is free; only a throttled caller waits, and it waits off the loop
+            if not bucket.acquire(priority, timeout=0):
+                if not await asyncio.to_thread(bucket.acquire, priority, _remaining(deadline)):
+                    raise self._timed_out()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if getattr(e, "http_status", None) != 429 or attempt == self.max_retries:
+                    raise
+                self.throttle(credential, e, attempt)
+
+    def throttle(self, credential, error, attempt):
+        """Pause the credential's bucket after a 429, returning the delay applied"""
+        self._count("throttled")
+        self._count("retries")
+        delay = _retry_after(error)
+        if delay is None:
+            delay = self.backoff * 2 ** attempt
+        # Retry-After can be hours; past max_backoff the retry simply gets another 429
+        delay = min(self.max_backoff, delay)
+        # Jitter so callers released together don't stampede the API again
+        delay += random.uniform(0, self.backoff)
+        print(f"Warning: Spotify rate limit hit, retrying in {delay:.1f}s")
+        self.bucket(credential).block_for(delay)
+        return delay
@@ -1,5 +1,803 @@
-from spotify_module import get_playlist_for_emotion
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
 
-emotion = "sad"
-playlists = get_playlist_for_emotion(emotion)
-print("Playlists found:", playlists)
\ No newline at end of file
+import numpy as np
+import pytest
+from spotipy.exceptions import SpotifyException
+
+# spotify_module reads credentials on first use; the fake server doesn't check them
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "test-client-id")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "test-client-secret")
+os.environ.setdefault("SPOTIPY_REDIRECT_URI", "http://localhost:8501/")
+
+import bench_spotify
+import index_refresh
+import load_test
+import mood_index
+import mood_ranking
+import records
+import shared_index
+import similarity
+import prewarm
+import profiling
+import spotify_async
+import spotify_module
+import theme
+from fake_spotify import FakeSpotifyServer, fake_id
+from records import UriSet, merge_unique
+from spotify_cache import TTLCache, QueryCache, DiskCache, SingleFlight
+from spotify_scheduler import RequestScheduler, RateLimitTimeout, TokenBucket, INTERACTIVE, BACKGROUND, counting
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    with FakeSpotifyServer() as server:
+        monkeypatch.setattr(spotify_module, "disk_cache", DiskCache(str(tmp_path / "cache.sqlite")))
+        monkeypatch.setitem(spotify_module.get_config(), "api_url", server.api_url)
+        monkeypatch.setitem(spotify_module.get_config(), "token_url", server.token_url)
+        spotify_module.clear_spotify_clients()
+        spotify_module.playlist_cache.clear()
+        spotify_module.search_cache.clear()
+        spotify_module.saved_status_cache.clear()
+        spotify_async._app_token.clear()
+        yield server
+        spotify_module.clear_spotify_clients()
+        spotify_module.playlist_cache.clear()
+        spotify_module.search_cache.clear()
+        spotify_module.saved_status_cache.clear()
+
+
+def test_import_is_lazy_and_needs_no_credentials():
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SPOTIPY_")}
+    check = (
+        "import sys, spotify_module\n"
+        "assert not {'spotipy', 'requests', 'dotenv'} & set(sys.modules), sorted(sys.modules)\n"
+        "try:\n"
+        "    spotify_module.get_config()\n"
+        "except ValueError:\n"
+        "    pass\n"
+        "else:\n"
+        "    raise AssertionError('missing credentials were accepted')\n"
+    )
+    result = subprocess.run([sys.executable, "-c", check], env=env, cwd=os.path.dirname(__file__) or ".",
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_playlists_for_emotion(server):
+    playlists = spotify_module.get_playlist_for_emotion_and_language("sad", "English")
+    assert len(playlists) == 6
+    assert playlists[0]["name"] == "Sad English Playlist #0"
+
+
+def test_playlist_queries_run_concurrently(server):
+    server.latency = 0.3
+    start = time.perf_counter()
+    playlists = spotify_module.get_playlist_for_emotion_and_language("party", "Hindi")
+    elapsed = time.perf_counter() - start
+
+    # Two sub-queries at 0.3s each: roughly one round-trip, not two
+    assert server.stats["api_requests"] == 2
+    assert elapsed < 0.55
+    # Results keep the language query priority order
+    assert [p["name"] for p in playlists[:3]] == [f"Party Hindi Songs #{n}" for n in range(3)]
+    assert [p["name"] for p in playlists[3:]] == [f"Party Bollywood Songs #{n}" for n in range(3)]
+
+
+def test_deeper_playlist_pages_run_concurrently(server, monkeypatch):
+    monkeypatch.setattr(spotify_module, "playlist_target", 10)
+    server.latency = 0.3
+    start = time.perf_counter()
+    playlists = spotify_module.get_playlist_for_emotion_and_language("party", "Hindi")
+    elapsed = time.perf_counter() - start
+
+    # Page 2 of both sub-queries goes out together: two round-trips, not three
+    assert len(playlists) == 10
+    assert server.stats["api_requests"] == 4
+    assert elapsed < 0.85
+    assert [p["name"] for p in playlists[6:]] == [f"Party Hindi Songs #{n}" for n in range(3, 6)] + \
+        ["Party Bollywood Songs #3"]
+
+
+def test_playlists_are_cached_across_callers(server):
+    first = spotify_module.get_playlist_for_emotion_and_language("chill", "Tamil")
+    second = spotify_module.get_playlist_for_emotion_and_language(" Chill ", "tamil", token_info=None)
+
+    assert second == first
+    assert server.stats["api_requests"] == 2
+    assert spotify_module.playlist_cache.stats["hits"] == 1
+    assert spotify_module.playlist_cache.stats["misses"] == 1
+
+
+def test_search_cache_reuses_larger_limits(server):
+    big = spotify_module.search_tracks("Daft  Punk", limit=10)
+    small = spotify_module.search_tracks(" daft punk ", limit=3)
+
+    assert small["tracks"] == big["tracks"][:3]
+    assert server.stats["api_requests"] == 1
+
+    spotify_module.search_tracks("daft punk", limit=20)
+    assert server.stats["api_requests"] == 2
+
+
+def test_query_cache_stays_within_byte_budget():
+    cache = QueryCache(max_bytes=4096)
+    for n in range(50):
+        cache.set(f"query {n}", 5, {"tracks": [{"name": f"song {n}"}] * 5})
+
+    assert cache.bytes <= 4096
+    assert cache.stats["evictions"] > 0
+    assert cache.get("query 49", 5) is not None
+    assert cache.get("query 0", 5) is None
+
+
+def test_large_playlists_are_added_in_ordered_chunks(server, monkeypatch):
+    monkeypatch.setattr(spotify_module, "chunk_retry_backoff", 0)
+    sp = spotify_module.get_spotify_client()
+    playlist = spotify_module.create_playlist("fake-user", "Big Mix", "", None)
+    uris = [f"spotify:track:{fake_id('bulk', n)}" for n in range(250)]
+
+    # Fail the second chunk once; it must be retried back into its original position
+    add_items = sp.playlist_add_items
+    calls = []
+    def flaky_add_items(playlist_id, items, position=None):
+        calls.append(position)
+        if len(calls) == 2:
+            raise SpotifyException(503, -1, "Service unavailable")
+        return add_items(playlist_id, items, position=position)
+    monkeypatch.setattr(sp, "playlist_add_items", flaky_add_items)
+
+    result = spotify_module.add_tracks_to_playlist(playlist["id"], uris, None)
+
+    assert result["ok"] and result["added"] == 250
+    assert [(c["size"], c["attempts"]) for c in result["chunks"]] == [(100, 1), (100, 2), (50, 1)]
+    assert calls == [None, None, None, 100]
+    assert server.playlists[playlist["id"]] == uris
+
+
+def test_library_saves_are_batched_and_deduped(server):
+    token_info = {"access_token": "user-token", "expires_at": time.time() + 3600}
+    uris = [f"spotify:track:{fake_id('library', n)}" for n in range(120)]
+    server.library.update(uris[:10])
+
+    status = spotify_module.save_tracks_to_library(uris + uris[:5], token_info)
+
+    assert all(status[uri] for uri in uris)
+    assert server.library == set(uris)
+    # 3 membership pages + 3 save pages (110 new tracks) for 125 requested
+    assert server.stats["api_requests"] == 6
+
+    # Membership now comes from the cache
+    assert spotify_module.get_saved_status(uris, token_info) == status
+    assert server.stats["api_requests"] == 6
+
+
+def test_rate_limited_requests_honor_retry_after(server):
+    server.throttle_next = 2
+    server.retry_after = 1
+    throttled = spotify_module.scheduler.stats["throttled"]
+    start = time.perf_counter()
+    results = spotify_module.search_tracks("rate limited", limit=1)
+
+    assert len(results["tracks"]) == 1
+    assert server.stats["throttled"] == 2
+    # Handled by the shared scheduler, not by urllib3 inside the calling thread
+    assert spotify_module.scheduler.stats["throttled"] - throttled == 2
+    assert time.perf_counter() - start >= 2
+
+
+def test_long_retry_after_is_capped_and_interactive_calls_give_up():
+    scheduler = RequestScheduler(rate=1000, burst=10, max_backoff=0.5, interactive_timeout=0.2)
+    error = SpotifyException(429, -1, "rate limited", headers={"Retry-After": "7200"})
+    assert scheduler.throttle("app", error, 0) <= scheduler.max_backoff + scheduler.backoff
+
+    # The script thread gets an error instead of hanging; background work waits it out
+    start = time.perf_counter()
+    with pytest.raises(RateLimitTimeout):
+        scheduler.call("app", lambda: "ok")
+    assert time.perf_counter() - start < 0.5
+    assert scheduler.stats["timeouts"] == 1
+    assert scheduler.call("app", lambda: "ok", priority=BACKGROUND) == "ok"
+
+
+def test_request_counting_only_sees_its_own_context():
+    scheduler = RequestScheduler(rate=1000, burst=100)
+    with counting() as counted:
+        scheduler.call("app", lambda: None)
+        # Work handed to a pool with the caller's context counts; another caller's doesn't
+        spotify_module._submit(scheduler.call, "app", lambda: None).result()
+        other = threading.Thread(target=scheduler.call, args=("app", lambda: None))
+        other.start()
+        other.join()
+    assert counted["calls"] == 2 and scheduler.stats["calls"] == 3
+
+
+def test_token_bucket_serves_interactive_first():
+    bucket = TokenBucket(rate=20, burst=1)
+    bucket.acquire()
+    served = []
+
+    def take(priority, name):
+        bucket.acquire(priority)
+        served.append(name)
+
+    waiters = [threading.Thread(target=take, args=(BACKGROUND, "background"))]
+    waiters[0].start()
+    time.sleep(0.01)
+    waiters.append(threading.Thread(target=take, args=(INTERACTIVE, "interactive")))
+    waiters[1].start()
+    for waiter in waiters:
+        waiter.join(1)
+
+    assert served == ["interactive", "background"]
+    assert not bucket.acquire(BACKGROUND, timeout=0.01)
+    with pytest.raises(ValueError):
+        RequestScheduler(rate=0)
+
+
+def test_warm_restart_is_served_from_disk(server):
+    playlists = spotify_module.get_playlist_for_emotion_and_language("dark", "Telugu")
+    tracks = spotify_module.search_tracks("night drive", limit=5)
+    requests_before = server.stats["api_requests"]
+
+    # A restarted worker starts with empty memory caches
+    spotify_module.playlist_cache.clear()
+    spotify_module.search_cache.clear()
+
+    assert spotify_module.get_playlist_for_emotion_and_language("dark", "Telugu") == playlists
+    assert spotify_module.search_tracks("Night Drive", limit=3)["tracks"] == tracks["tracks"][:3]
+    assert server.stats["api_requests"] == requests_before
+
+
+def test_disk_cache_expiry_and_compaction(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    cache.set("search", "a", {"x": 1})
+    cache.set("search", "b", {"x": 2}, ttl=-1)
+    cache.set("search", "c", {"x": 3}, ttl=0)
+
+    assert cache.get("search", "a") == {"x": 1}
+    assert cache.get("search", "b") is None and cache.get("search", "c") is None
+    assert cache.stats()["namespaces"]["search"] == {"entries": 3, "expired": 2, "value_bytes": 24}
+    assert cache.compact() == 2
+    assert [row[1] for row in cache.entries()] == ["a"]
+
+
+def test_concurrent_identical_searches_share_one_fetch(server):
+    server.latency = 0.2
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(
+        spotify_module.get_playlist_for_emotion_and_language("party", "English"))) for _ in range(10)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    assert len(results) == 10 and all(r == results[0] for r in results)
+    # One fetch of the two language sub-queries for all ten sessions
+    assert server.stats["api_requests"] == 2
+
+
+def test_single_flight_propagates_errors_and_timeouts():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(1)
+        raise ValueError("upstream failed")
+
+    def call(fn, timeout=None):
+        try:
+            flight.do("key", fn, timeout=timeout)
+        except Exception as e:
+            errors.append(type(e).__name__)
+
+    leader = threading.Thread(target=call, args=(failing,))
+    leader.start()
+    time.sleep(0.05)
+    follower = threading.Thread(target=call, args=(lambda: "not called",))
+    impatient = threading.Thread(target=call, args=(lambda: "not called", 0.01))
+    follower.start()
+    impatient.start()
+    impatient.join()
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert sorted(errors) == ["TimeoutError", "ValueError", "ValueError"]
+    assert flight.stats["coalesced"] == 2
+
+
+def test_ttl_cache_serves_stale_while_revalidating():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, stale_ttl=10, clock=lambda: now[0])
+    refreshed = threading.Event()
+
+    def refresh():
+        refreshed.set()
+        return "new"
+
+    assert cache.get_or_load("a", lambda: "old") == "old"
+    now[0] = 15
+    assert cache.get_or_load("a", lambda: "unused", refresh=refresh) == "old"
+    assert refreshed.wait(1)
+    for _ in range(100):
+        if cache.get("a") == "new":
+            break
+        time.sleep(0.01)
+    assert cache.get("a") == "new"
+
+    # Past ttl + stale_ttl the entry is gone and loads synchronously
+    now[0] = 40
+    assert cache.get_or_load("a", lambda: "reloaded") == "reloaded"
+    assert cache.stats["expirations"] == 1
+
+    cache.set("b", 1)
+    cache.set("c", 2)
+    assert "a" not in cache
+    assert cache.stats["evictions"] == 1
+
+
+def test_prewarm_fills_every_combination(server, monkeypatch):
+    monkeypatch.setattr(spotify_module, "scheduler", RequestScheduler(rate=1000, burst=100))
+    summary = prewarm.prewarm(budget=0)
+
+    assert summary["combinations"] == len(spotify_module.emotion_genres) * len(spotify_module.language_queries)
+    assert summary["requests"] == server.stats["api_requests"]
+    assert spotify_module.scheduler.stats["background_calls"] >= summary["requests"]
+    assert len(spotify_module.playlist_cache) == summary["combinations"]
+
+    # First clicks are now served from memory
+    spotify_module.get_playlist_for_emotion_and_language("angry", "Kannada")
+    assert server.stats["api_requests"] == summary["requests"]
+
+
+def test_async_api_fans_out_over_pooled_connections(server):
+    token_info = {"access_token": "user-token", "expires_at": time.time() + 3600}
+    uris = [f"spotify:track:{fake_id('async', n)}" for n in range(150)]
+
+    async def session():
+        server.latency = 0.2
+        start = time.perf_counter()
+        searches = await asyncio.gather(*(spotify_async.search_tracks(f"song {n}", limit=1) for n in range(20)))
+        elapsed = time.perf_counter() - start
+        server.latency = 0
+        playlists = await spotify_async.get_playlist_for_emotion_and_language("romantic", "Hindi")
+        saved = await spotify_async.save_tracks_to_library(uris, token_info)
+        playlist = await spotify_async.create_playlist("fake-user", "Async Mix", "", token_info)
+        added = await spotify_async.add_tracks_to_playlist(playlist["id"], uris, token_info)
+        await spotify_async.aclose()
+        return searches, elapsed, playlists, saved, playlist, added
+
+    searches, elapsed, playlists, saved, playlist, added = asyncio.run(session())
+
+    assert all(len(s["tracks"]) == 1 for s in searches)
+    assert elapsed < 1.0  # 20 searches at 0.2s each, overlapped
+    assert len(playlists) == 6
+    assert spotify_module.get_playlist_for_emotion_and_language("romantic", "Hindi") == playlists
+    assert all(saved.values()) and server.library == set(uris)
+    assert added["ok"] and server.playlists[playlist["id"]] == uris
+    assert server.stats["token_requests"] == 1
+
+
+def test_async_playlists_share_the_sync_tiers(server, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(spotify_module, "playlist_cache", TTLCache(maxsize=8, ttl=10, stale_ttl=100, clock=lambda: now[0]))
+    monkeypatch.setattr(spotify_module, "playlist_target", 8)
+    fetch = spotify_async.get_playlist_for_emotion_and_language
+
+    # Short of the target after the first searches, it pages deeper like the sync API
+    playlists = asyncio.run(fetch("calm", "Hindi"))
+    assert len(playlists) == 8
+    assert spotify_module.get_playlist_for_emotion_and_language("calm", "Hindi") == playlists
+
+    # Stale entries are served at once and refreshed in the background
+    now[0] = 20
+    requests_made = server.stats["api_requests"]
+    assert asyncio.run(fetch("calm", "Hindi")) == playlists
+    deadline = time.time() + 5
+    while spotify_module.playlist_cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert spotify_module.playlist_cache.stats["stale_hits"] == 1
+    assert server.stats["api_requests"] > requests_made
+
+
+def test_async_search_reads_the_disk_tier_and_retries_5xx(server):
+    async def search(query):
+        try:
+            return await spotify_async.search_tracks(query, limit=2)
+        finally:
+            await spotify_async.aclose()
+
+    # A 5xx is retried like the sync client's urllib3 Retry does
+    server.fail_next = 2
+    results = asyncio.run(search("async resilient"))
+    assert len(results["tracks"]) == 2 and server.stats["errors"] == 2
+
+    # A cold memory tier is refilled from disk, not the API
+    requests_made = server.stats["api_requests"]
+    spotify_module.search_cache.clear()
+    assert asyncio.run(search("async resilient")) == results
+    assert server.stats["api_requests"] == requests_made
+
+
+def test_app_client_is_reused(server):
+    for n in range(5):
+        results = spotify_module.search_tracks(f"daft punk {n}", limit=2)
+        assert len(results["tracks"]) == 2
+
+    assert server.stats["api_requests"] == 5
+    assert server.stats["token_requests"] == 1
+    assert server.stats["connections"] == 1
+
+
+def test_user_clients_are_pooled_and_evicted(server, monkeypatch):
+    now = 1_000_000
+    monkeypatch.setattr(spotify_module.time, "time", lambda: now)
+    token_info = {"access_token": "user-token", "expires_at": now + 3600}
+
+    first = spotify_module.get_spotify_client(token_info)
+    assert spotify_module.get_spotify_client(dict(token_info)) is first
+    assert spotify_module.get_spotify_client() is not first
+
+    # Within the expiry margin a caller still passing the token keeps its client
+    now += 3600 - spotify_module.token_expiry_margin // 2
+    assert spotify_module.get_spotify_client(token_info) is first
+    assert spotify_module.get_spotify_client(token_info) is first
+
+    now += spotify_module.token_expiry_margin
+    assert spotify_module.get_spotify_client(token_info) is not first
+
+
+def test_theme_is_compiled_once_per_mood():
+    theme.precompile()
+    html = theme.compile_theme("💔 Heartbroken")
+    assert theme.compile_theme("💔 Heartbroken") is html
+    assert html.count("<style>") == 1 and "/*" not in html
+    assert html.startswith("<style>@import url(")
+    assert theme.MOOD_MAPPING["💔 Heartbroken"]["gradient"][0] in html
+    assert theme.payload_size("💔 Heartbroken") == len(html.encode("utf-8"))
+
+
+def test_profiler_aggregates_sections_and_spotify_calls(server, monkeypatch, tmp_path):
+    profiler = profiling.Profiler(enabled=True)
+    monkeypatch.setattr(profiling, "section", profiler.section)
+    for ms in range(1, 21):
+        profiler.record("render", ms / 1000)
+    spotify_module.search_tracks("profiled", limit=2)
+
+    summary = profiler.summary()
+    assert summary["render"]["count"] == 20
+    assert summary["render"]["p50"] == 0.010 and summary["render"]["p95"] == 0.019
+    assert summary["spotify GET /search"]["count"] == 1
+
+    profiler.export(str(tmp_path / "profile.prom"))
+    text = (tmp_path / "profile.prom").read_text()
+    assert 'emotunes_section_seconds{section="render",quantile="0.95"} 0.019000' in text
+    assert profiling.Profiler().section("off") is profiling.Profiler().section("also off")
+
+
+def test_api_benchmark_runs_against_fake_server():
+    results = bench_spotify.bench_api(concurrency=(1, 2), ops=4, latency=0, jitter=0,
+                                      throttle_rate=0.2, retry_after=0.01, scenarios=["search_tracks", "add_tracks"])
+    assert set(results) == {"search_tracks@1", "search_tracks@2", "add_tracks@1", "add_tracks@2"}
+    assert all(r["failures"] == 0 and r["ops_per_sec"] > 0 for r in results.values())
+
+    baseline = {name: {**r, "ops_per_sec": r["ops_per_sec"] * 10} for name, r in results.items()}
+    assert len(bench_spotify.compare_to_baseline(results, baseline)) == 4
+    assert bench_spotify.compare_to_baseline(results, results) == []
+
+
+def test_import_time_benchmark_lists_the_module_s_own_imports():
+    result = bench_spotify.bench_import_time(runs=1)
+    names = [name for _, name in result["heaviest_imports"]]
+    assert result["cumulative_us"] > 0 and len(names) == 5
+    assert "spotify_module" not in names and "site" not in names
+
+
+def test_load_test_journey_completes_against_fake_server(server):
+    at, timings, error = load_test.run_journey(seed=3)
+
+    assert error is None
+    assert [name for name, _ in timings] == ["load", "mood", "language", "search_input", "search",
+                                             "load_more", "save", "recommend", "create_playlist"]
+    assert len(server.library) == 20
+    assert [len(uris) for uris in server.playlists.values()] == [20]
+
+
+def test_repeated_app_searches_are_served_locally(server):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(load_test.APP_PATH, default_timeout=30).run()
+    at.text_input(key="main_search").input("repeat me").run()
+    for _ in range(3):
+        at.button(key="search_button").click().run()
+    # One search; no pages requested ahead of a "Load more" click
+    assert server.stats["api_requests"] == 1
+    at.button(key="load_more_results").click().run()
+    assert len(at.session_state["search_results"]["tracks"]) == 20 and not at.exception
+
+
+def test_records_are_slotted_and_read_like_dicts(server):
+    results = spotify_module.search_tracks("compact records", limit=3)
+    track = results["tracks"][0]
+
+    assert isinstance(track, records.Track) and not hasattr(track, "__dict__")
+    assert track["url"] == f"https://open.spotify.com/track/{track['uri'].split(':')[-1]}"
+    assert track.get("image", "n/a") == "n/a" and "preview_url" in track
+    assert results["tracks"][0]["artist"] is results["tracks"][1]["artist"]  # interned
+    assert records.Track.from_dict(track.to_dict()) == track
+
+    # The disk tier stores plain JSON and hands records back
+    spotify_module.search_cache.clear()
+    assert spotify_module.search_tracks("compact records", limit=3) == results
+    assert server.stats["api_requests"] == 1
+
+
+def test_spotify_ids_pack_into_128_bits():
+    for spotify_id in (fake_id("pack", n) for n in range(50)):
+        packed = records.pack_id(spotify_id)
+        assert 0 <= packed < 1 << 128 and records.unpack_id(packed) == spotify_id
+    assert records.pack_id("0" * 22) == 0 and records.unpack_id(0) == "0" * 22
+    assert records.pack_id("Z" * 22) is None  # above 2**128
+    assert records.pack_id("not-a-base62-id-at-all") is None
+
+    uri = f"spotify:track:{fake_id('uri')}"
+    assert records.unpack_uri("track", records.pack_uri(uri)) == uri
+    local = "spotify:local:Artist:Album:Title:215"
+    assert records.pack_uri(local) == local and records.unpack_uri("track", local) == local
+
+    playlist = records.Playlist.from_dict({"name": "p", "uri": f"spotify:playlist:{fake_id('p')}"})
+    assert playlist.embed_url == f"https://open.spotify.com/embed/playlist/{fake_id('p')}"
+
+
+def test_uri_set_and_cross_query_merge():
+    uris = [f"spotify:track:{fake_id('merge', n)}" for n in range(3000)]
+    saved = UriSet(uris[:2])
+    assert saved.add(uris[2]) and not saved.add(uris[0])
+    assert list(saved) == uris[:3] and uris[1] in saved and uris[5] not in saved
+
+    # Three queries of 2000 overlapping candidates each
+    groups = [uris[0:2000], uris[500:2500], uris[1000:3000]]
+    start = time.perf_counter()
+    merged = merge_unique(groups)
+    assert time.perf_counter() - start < 0.5
+    assert merged == uris
+    assert merge_unique(groups, limit=4, interleave=True) == [uris[0], uris[500], uris[1000], uris[1]]
+    assert merge_unique(groups, seen=UriSet(uris[:2999])) == [uris[2999]]
+
+
+def test_search_pages_are_prefetched_and_cancelled(server):
+    server.search_total = 25
+    pages = spotify_module.iter_search_pages("paged", page_size=10)
+    first = next(pages)
+    # The second page was requested while the first was being consumed
+    time.sleep(0.2)
+    assert server.stats["api_requests"] == 2
+    assert [len(page) for page in pages] == [10, 5]
+    assert len({track["uri"] for track in first}) == 10
+
+    server.latency = 0.2
+    pages = spotify_module.iter_search_pages("stopped early", page_size=10, max_results=30)
+    next(pages)
+    pages.close()
+    time.sleep(0.5)
+    # At most the prefetch already in flight when the consumer stopped; nothing after it
+    assert server.stats["api_requests"] <= 5
+
+
+def test_mood_index_answers_offline_after_harvest(server, tmp_path):
+    index = mood_index.MoodIndex()
+    searches = index.harvest(["energetic", "party"], ["English", "Hindi"], per_tag=5)
+    # "dance" is tagged under both emotions and only searched once per language
+    assert searches == server.stats["api_requests"] == 2 * 24
+    requests_made = server.stats["api_requests"]
+
+    start = time.perf_counter()
+    tracks = index.tracks_for("party", "Hindi", limit=8)
+    assert time.perf_counter() - start < 0.05
+    assert server.stats["api_requests"] == requests_made
+    assert len(tracks) == 8 and all("Hindi" in track.name for track in tracks)
+    assert all(index.languages[track.packed_id] == {"hindi"} for track in tracks)
+    # Top-ranked results of each tag search come first
+    assert all(track.name.endswith("Song 0") for track in tracks)
+    assert index.tracks_for("lonely", "Hindi") == [] and index.tracks_for("unknown") == []
+
+    for name in ("index.json", "index.csv"):
+        index.save(str(tmp_path / name))
+        restored = mood_index.MoodIndex()
+        assert restored.load(str(tmp_path / name)) == len(index)
+        assert restored.tracks_for("party", "Hindi", limit=8) == tracks
+
+    # Ranking stays safe while another thread removes and re-adds the same tracks
+    stop, errors = threading.Event(), []
+
+    def churn():
+        while not stop.is_set():
+            for track in tracks:
+                tags = dict(index.tags[track.packed_id])
+                for tag in tags:
+                    index.discard_tag(track.packed_id, tag)
+                index.add(track, tags, ["Hindi"])
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=churn)
+    writer.start()
+    try:
+        for _ in range(1000):
+            try:
+                index.tracks_for("party", "Hindi", limit=8)
+            except Exception as e:
+                errors.append(e)
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+
+
+def test_mood_ranking_scores_large_pools_in_one_pass():
+    matrix = bench_spotify.random_pool(100_000)
+    total = matrix.scores("party", "hindi")
+    start = time.perf_counter()
+    best = matrix.rank("party", "hindi", limit=20)
+    assert time.perf_counter() - start < 0.1
+    # Same as a full sort of the eligible rows
+    expected = [row for row in np.lexsort((np.arange(len(total)), -total)) if np.isfinite(total[row])][:20]
+    assert best == expected
+    assert all(matrix.languages[row, matrix.language_columns["hindi"]] for row in best)
+
+    # With the same tags, the mood's attribute profile decides which tracks fit
+    calm, loud = ({"energy": 0.1, "tempo": 70}, {"energy": 0.9, "tempo": 170})
+    matrix = mood_ranking.CandidateMatrix.build(["calm", "loud"], [{"rock": 1.0}] * 2, [calm, loud])
+    assert matrix.rank("energetic") == ["loud"]
+    assert matrix.rank("heartbroken") == ["calm"]
+    assert matrix.rank("unknown") == []
+
+    # Language is a filter: a strong fit in another language is never returned
+    matrix = mood_ranking.CandidateMatrix.build(["english", "hindi"], [{"rock": 1.0}, {"rock": 0.2}],
+                                                [loud, loud], [["english"], ["hindi"]])
+    assert matrix.rank("energetic", "hindi") == ["hindi"]
+    assert matrix.rank("energetic", "tamil") == []
+    assert matrix.rank("energetic") == ["english", "hindi"]
+
+
+def test_similarity_index_is_memory_mapped_and_takes_inserts(tmp_path):
+    pool = bench_spotify.random_pool(100_000)
+    vectors = pool.features / np.linalg.norm(pool.features, axis=1, keepdims=True)
+    tracks = [records.Track(f"Track {n}", "Artist", n + 1) for n in range(len(pool))]
+    index = similarity.SimilarityIndex()
+    assert index.add_many(tracks, vectors) == len(tracks)
+    index.save(str(tmp_path))
+
+    index = similarity.SimilarityIndex.load(str(tmp_path))
+    assert isinstance(index._vectors, np.memmap) and len(index) == len(tracks)
+    # A near-duplicate seen after the save is found straight away
+    twin = records.Track("Twin", "Artist", 0)
+    assert index.add(twin, vectors[42] + 0.01 * vectors[7])
+    start = time.perf_counter()
+    similar = index.similar(tracks[42], limit=10)
+    assert time.perf_counter() - start < 0.05
+    assert similar[0] == twin and tracks[42] not in similar and len(similar) == 10
+    # Approximate, but each result is at least as close as a random track on average
+    scores = [float(vectors[track.packed_id - 1] @ vectors[42]) for track in similar[1:]]
+    assert min(scores) > float(np.mean(vectors @ vectors[42]))
+
+    tagged = similarity.embed({"rock": 1.0, "metal": 0.5}, {"energy": 0.9})
+    assert np.isclose(np.linalg.norm(tagged), 1.0) and len(index.nearest(tagged, limit=5)) == 5
+    assert index.similar("spotify:track:1" + "0" * 21) == []
+
+
+def test_search_results_join_the_similarity_index(server, monkeypatch):
+    monkeypatch.setattr(similarity, "_index", None)
+    monkeypatch.setattr(similarity, "_thread", None)
+    monkeypatch.setattr(similarity, "index_dir", "")
+    similarity.start_background_warm().join(5)
+    assert similarity._index is not None
+
+    tracks = spotify_module.search_tracks("sad acoustic covers", limit=5)["tracks"]
+    assert similarity.query_tags("Sad  Acoustic covers") == ["acoustic", "sad acoustic"]
+    assert similarity.add_search_results("sad acoustic covers", tracks) == 5
+    assert similarity.add_search_results("sad acoustic covers", tracks) == 0
+    assert set(similarity.more_like_this(tracks[0], limit=4)) == set(tracks[1:])
+    # Without a tag to embed them by, results aren't indexed
+    untagged = spotify_module.search_tracks("the beatles", limit=2)["tracks"]
+    assert similarity.add_search_results("the beatles", untagged) == 0
+
+
+def test_shared_index_is_mapped_and_swapped_without_restart(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(spotify_module, "shared_index_path", str(tmp_path / "plane.bin"))
+    monkeypatch.setattr(shared_index, "check_interval", 0)
+    monkeypatch.setattr(shared_index, "_plane", None)
+    index = mood_index.MoodIndex()
+    index.harvest(["party"], ["Hindi"], per_tag=3)
+    key = spotify_module._playlist_cache_key("party", "Hindi")
+    playlists = spotify_module.get_playlist_for_emotion_and_language("party", "Hindi")
+    assert shared_index.build_plane(source=index, playlist_sets={key: playlists}) == 1
+
+    plane = shared_index.get_plane()
+    # Every array is a read-only view of the one mapping, not a per-process copy
+    assert all(not array.flags.owndata and not array.flags.writeable for array in plane.arrays.values() if array.size)
+    tracks = index.tracks_for("party", "Hindi", limit=5)
+    assert mood_index.get_tracks_for_emotion_and_language("party", "Hindi", limit=5) == tracks
+    assert similarity.is_indexed(tracks[0]) and len(similarity.more_like_this(tracks[0], limit=3)) == 3
+
+    # A fresher disk entry wins over the plane's copy
+    fresher = playlists[::-1]
+    spotify_module._store_playlists(key, fresher)
+    assert spotify_module._local_playlists(key) == fresher
+
+    # Without one, playlists come from the plane without touching the API
+    monkeypatch.setattr(spotify_module, "disk_cache", None)
+    spotify_module.playlist_cache.clear()
+    requests_made = server.stats["api_requests"]
+    assert spotify_module.get_playlist_for_emotion_and_language("party", "Hindi") == playlists
+    assert server.stats["api_requests"] == requests_made
+    # ...until the plane is older than the disk tier's TTL
+    monkeypatch.setattr(spotify_module, "disk_cache_ttl", 0)
+    assert spotify_module._local_playlists(key) is None
+
+    # A rebuild is picked up by the running process; lookups on the old generation still work
+    index.harvest(["party"], ["English"], per_tag=3)
+    assert shared_index.build_plane(source=index, playlist_sets={}) == 2
+    current = shared_index.get_plane()
+    assert current.generation == 2 and len(current.tracks) == len(index) > len(plane.tracks)
+    assert plane.tracks_for("party", "Hindi", limit=5) == tracks
+    assert current.playlists(key) is None
+
+
+def test_index_refresh_refetches_only_what_changed(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(spotify_module, "shared_index_path", str(tmp_path / "plane.bin"))
+    monkeypatch.setattr(similarity, "_index", similarity.SimilarityIndex())
+    now = [1000.0]
+    index = mood_index.MoodIndex()
+    index_path = str(tmp_path / "index.json")
+    pipeline = index_refresh.RefreshPipeline(
+        index, str(tmp_path / "refresh.json"), index_path, ["party"], ["Hindi"], clock=lambda: now[0]
+    )
+
+    # A small budget defers the rest to the next cycle; after that nothing is due
+    first = pipeline.run_cycle(budget=3)
+    assert 3 <= first["requests"] < 10 and first["deferred"] > 0
+    second = pipeline.run_cycle(budget=100)
+    assert second["deferred"] == 0 and first["playlists"] + second["playlists"] == 6
+    assert pipeline.run_cycle(budget=100)["requests"] == 0
+    assert mood_index.MoodIndex().load(index_path) == len(index) == len(similarity.get_index()) > 0
+
+    # Once stale, every query is refetched but only the playlist whose snapshot changed is
+    key = spotify_module._playlist_cache_key("party", "Hindi")
+    playlist = spotify_module.playlist_cache.get(key)[0]
+    server.search_revisions["party hindi"] = 1
+    server.playlist_revisions[playlist.uri.rpartition(":")[2]] = 1
+    now[0] += index_refresh.query_ttl
+    live = index.tracks
+    third = pipeline.run_cycle(budget=100)
+    assert third["playlists"] == 1 and third["deferred"] == 0
+    # Changes were made to a copy and swapped in with the ranking matrix already built
+    assert index.tracks is not live and index._matrix is not None
+    assert spotify_module.playlist_cache.get(key)[0].snapshot_id != playlist.snapshot_id
+
+    # The harvest result that dropped out loses its tag; the new one gains it
+    def track_id(query, n):
+        return records.pack_uri(f"spotify:track:{fake_id('track', query, n)}")
+    assert "party" not in index.tags.get(track_id("party hindi", 0), {})
+    assert index.tags[track_id("party hindi", index_refresh.harvest_limit)]["party"] > 0
+    # Likewise for the changed playlist's items; no other source had its dropped track
+    playlist_query = f"playlist {playlist.uri.rpartition(':')[2]}"
+    assert track_id(playlist_query, 0) not in index.tracks
+    assert track_id(playlist_query, server.playlist_length) in index.tracks
+
+    # One process refreshes at a time; another takes over from the saved state and index
+    other = index_refresh.RefreshPipeline(
+        mood_index.MoodIndex(), str(tmp_path / "refresh.json"), index_path, ["party"], ["Hindi"], clock=lambda: now[0]
+    )
+    assert other.run_cycle(budget=100) is None
+    pipeline.close()
+    assert other.run_cycle(budget=100)["requests"] == 0
+    assert other.index.matrix().keys == index.matrix().keys
+    other.close()
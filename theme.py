@@ -0,0 +1,457 @@
+"""
+Theme compiler for the Streamlit app.
+
+Builds one minified stylesheet per mood from MOOD_MAPPING and assets/background.css,
+caches it for the life of the process, and hands it to app.py to inject with a
+single st.markdown call per rerun instead of rebuilding several f-string style blocks.
+"""
+import os
+import re
+from functools import lru_cache
+
+from moods import MOOD_MAPPING
+
+DEFAULT_MOOD = "⚡ Energetic"
+BACKGROUND_CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "background.css")
+
+
+# Custom CSS for modern styling with enhanced blur and softer transitions
+def _base_css(mood_data):
+    return f"""
+    /* Import Google Fonts */
+    @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;500;600;700&family=Quicksand:wght@400;500;600;700&display=swap');
+
+    /* Base Font Settings */
+    * {{
+        font-family: 'Poppins', sans-serif;
+    }}
+
+    /* Modern Card Styling with enhanced depth */
+    .stApp {{
+        background: linear-gradient(135deg, 
+            {mood_data["gradient"][0]}dd 0%,
+            {mood_data["gradient"][1]}ee 50%,
+            {mood_data["gradient"][2]}dd 100%
+        ) !important;
+        background-size: 400% 400% !important;
+        animation: gradientBG 15s ease infinite;
+        min-height: 100vh;
+    }}
+
+    /* Typography Styles */
+    h1, h2, h3, h4, h5, h6 {{
+        font-family: 'Quicksand', sans-serif;
+        font-weight: 700;
+        color: white;
+    }}
+
+    /* Button Styling */
+    .stButton > button {{
+        font-family: 'Quicksand', sans-serif !important;
+        font-weight: 600 !important;
+        padding: 0.4em 1em !important;
+        border: none !important;
+        background: rgba(255, 255, 255, 0.1) !important;
+        color: white !important;
+        transition: all 0.3s ease !important;
+        backdrop-filter: blur(10px) !important;
+        -webkit-backdrop-filter: blur(10px) !important;
+    }}
+
+    .stButton > button:hover {{
+        transform: translateY(-2px) !important;
+        background: rgba(255, 255, 255, 0.2) !important;
+        box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2) !important;
+    }}
+
+    /* Primary button style for selected mood */
+    .stButton > button[kind="primary"] {{
+        background: linear-gradient(135deg,
+            {mood_data["gradient"][0]} 0%,
+            {mood_data["gradient"][1]} 100%
+        ) !important;
+        box-shadow: 0 4px 12px {mood_data["gradient"][0]}66 !important;
+    }}
+
+    /* Input Field Styling */
+    .stTextInput input {{
+        background-color: rgba(255, 255, 255, 0.9) !important;
+        border: 1px solid rgba(255, 255, 255, 0.2) !important;
+        color: #333 !important;
+        border-radius: 8px !important;
+    }}
+
+    /* Selectbox Styling */
+    .stSelectbox > div > div {{
+        background-color: rgba(255, 255, 255, 0.9) !important;
+        border: 1px solid rgba(255, 255, 255, 0.2) !important;
+        color: #333 !important;
+        border-radius: 8px !important;
+    }}
+
+    /* Label colors */
+    .stTextInput label, .stSelectbox label {{
+        color: white !important;
+    }}
+
+    /* Sidebar styling */
+    .css-1d391kg {{
+        background: linear-gradient(to bottom,
+            {mood_data["contrast"]},
+            rgba(25, 25, 35, 0.98)
+        ) !important;
+    }}
+
+    /* Gradient animation */
+    @keyframes gradientBG {{
+        0% {{ background-position: 0% 50%; }}
+        50% {{ background-position: 100% 50%; }}
+        100% {{ background-position: 0% 50%; }}
+    }}
+"""
+
+
+# Mood-specific gradients, particles and glow effects
+def _mood_css(mood_data):
+    return fr"""
+    .stApp {{
+        background: linear-gradient(
+            135deg,
+            {mood_data['gradient'][0]}dd 0%,
+            {mood_data['gradient'][1]}ee 35%,
+            {mood_data['gradient'][2]}dd 65%,
+            {mood_data['gradient'][0]}dd 100%
+        ) !important;
+        background-size: 400% 400% !important;
+        animation: gradientBG 20s ease infinite;
+        min-height: 100vh;
+        -webkit-background-size: 400% 400% !important;
+        -moz-background-size: 400% 400% !important;
+        -o-background-size: 400% 400% !important;
+    }}
+    
+    /* Enhanced gradient animation */
+    @keyframes gradientBG {{
+        0% {{ background-position: 0% 50%; }}
+        50% {{ background-position: 100% 50%; }}
+        100% {{ background-position: 0% 50%; }}
+    }}
+
+    /* Mood-specific particle colors and effects */
+    .particle {{
+        background: linear-gradient(
+            135deg,
+            {mood_data['secondary_gradient'][0]},
+            {mood_data['secondary_gradient'][1]}
+        );
+        box-shadow: 
+            0 0 20px {mood_data['gradient'][0]}88,
+            0 0 40px {mood_data['gradient'][1]}44;
+        backdrop-filter: blur(8px);
+        -webkit-backdrop-filter: blur(8px);
+    }}
+
+    /* Enhanced mood icon animation */
+    .mood-icon {{
+        font-size: 4rem;
+        animation: float 6s ease-in-out infinite;
+        display: inline-block;
+        margin: 10px;
+        background: linear-gradient(
+            135deg,
+            {mood_data['gradient'][0]},
+            {mood_data['gradient'][1]},
+            {mood_data['gradient'][2]}
+        );
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        text-shadow: 
+            0 8px 24px {mood_data['gradient'][0]}88,
+            0 0 40px {mood_data['gradient'][1]}66;
+        filter: drop-shadow(0 0 8px {mood_data['gradient'][1]}66);
+    }}
+
+    /* Smooth hover transitions with mood colors */
+    .glass-card {{
+        background: linear-gradient(
+            135deg,
+            rgba(255, 255, 255, 0.08),
+            rgba(255, 255, 255, 0.12)
+        );
+        backdrop-filter: blur(20px);
+        -webkit-backdrop-filter: blur(20px);
+        border: 1px solid rgba(255, 255, 255, 0.1);
+        border-radius: 20px;
+        padding: 25px;
+        transition: all 0.5s cubic-bezier(0.4, 0, 0.2, 1);
+        box-shadow: 
+            0 8px 32px 0 rgba(0, 0, 0, 0.1),
+            inset 0 0 0 1px rgba(255, 255, 255, 0.05);
+    }}
+
+    .glass-card:hover {{
+        transform: translateY(-5px) scale(1.02);
+        background: linear-gradient(
+            135deg,
+            rgba(255, 255, 255, 0.12),
+            rgba(255, 255, 255, 0.18)
+        );
+        box-shadow: 
+            0 15px 35px rgba(0, 0, 0, 0.2),
+            inset 0 0 0 1px rgba(255, 255, 255, 0.1),
+            0 0 20px {mood_data['gradient'][0]}33,
+            0 0 40px {mood_data['gradient'][1]}22;
+    }}
+
+    /* Mobile optimization with enhanced colors */
+    @media (max-width: 768px) {{
+        .stApp {{
+            background: linear-gradient(
+                135deg,
+                {mood_data['gradient'][0]}ee 0%,
+                {mood_data['gradient'][1]}ff 50%,
+                {mood_data['gradient'][2]}ee 100%
+            ) !important;
+            background-size: 300% 300% !important;
+            animation: gradientBG 15s ease infinite;
+        }}
+
+        .particle {{
+            opacity: 0.25 !important;
+            mix-blend-mode: screen;
+        }}
+    }}
+
+    /* Enhanced text effects with mood colors */
+    .mood-title {{
+        font-size: 3rem;
+        font-weight: bold;
+        margin: 20px 0;
+        background: linear-gradient(
+            135deg,
+            {mood_data['gradient'][0]},
+            {mood_data['gradient'][1]},
+            {mood_data['gradient'][2]},
+            {mood_data['secondary_gradient'][0]},
+            {mood_data['secondary_gradient'][1]}
+        );
+        background-size: 300% auto;
+        animation: shimmer 8s linear infinite;
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        text-shadow: 
+            0 8px 24px {mood_data['gradient'][0]}88,
+            0 0 40px {mood_data['gradient'][1]}66;
+        filter: drop-shadow(0 0 12px {mood_data['gradient'][1]}44);
+    }}
+
+    @keyframes shimmer {{
+        0% {{ background-position: 0% center; }}
+        100% {{ background-position: 300% center; }}
+    }}
+
+    /* Add ambient light effect */
+    .ambient-light {{
+        position: fixed;
+        width: 100%;
+        height: 100%;
+        top: 0;
+        left: 0;
+        pointer-events: none;
+        background: radial-gradient(
+            circle at 50% 50%,
+            {mood_data['gradient'][1]}22,
+            transparent 80%
+        );
+        mix-blend-mode: overlay;
+        z-index: -1;
+        animation: pulse 8s ease-in-out infinite;
+    }}
+
+    @keyframes pulse {{
+        0%, 100% {{ opacity: 0.5; transform: scale(1); }}
+        50% {{ opacity: 0.8; transform: scale(1.1); }}
+    }}
+    """
+
+
+# Animated quote box in the mood's colors
+def _quote_css(mood_data):
+    return fr"""
+    @keyframes quoteGlow {{
+        0% {{ box-shadow: 0 0 20px {mood_data['gradient'][0]}66; }}
+        50% {{ box-shadow: 0 0 30px {mood_data['gradient'][1]}88; }}
+        100% {{ box-shadow: 0 0 20px {mood_data['gradient'][0]}66; }}
+    }}
+
+    .quote-box {{
+        position: relative;
+        padding: 40px;
+        background: linear-gradient(
+            135deg,
+            {mood_data['gradient'][0]}22,
+            {mood_data['gradient'][1]}33
+        );
+        border-radius: 20px;
+        backdrop-filter: blur(10px);
+        -webkit-backdrop-filter: blur(10px);
+        margin: 30px 0;
+        border: 2px solid rgba(255, 255, 255, 0.1);
+        animation: quoteGlow 4s ease-in-out infinite;
+        overflow: hidden;
+        box-shadow: 
+            0 10px 30px {mood_data['gradient'][0]}33,
+            0 5px 15px rgba(0, 0, 0, 0.2);
+    }}
+
+    .quote-text {{
+        font-family: 'Quicksand', sans-serif;
+        font-size: 2rem;
+        font-weight: 600;
+        line-height: 1.6;
+        color: white;
+        text-shadow: 
+            /* Outline for better contrast */
+            -1px -1px 0 {mood_data['contrast']},
+            1px -1px 0 {mood_data['contrast']},
+            -1px 1px 0 {mood_data['contrast']},
+            1px 1px 0 {mood_data['contrast']},
+            /* Original glow */
+            2px 2px 4px {mood_data['gradient'][0]}99;
+        margin-bottom: 20px;
+        text-align: center;
+        letter-spacing: 0.5px;
+    }}
+
+    .quote-author {{
+        font-family: 'Poppins', sans-serif;
+        font-size: 1.2rem;
+        color: {mood_data['gradient'][2]};
+        font-weight: 500;
+        text-align: center;
+        letter-spacing: 1px;
+        text-shadow: 
+            /* Outline for better contrast */
+            -1px -1px 0 {mood_data['contrast']},
+            1px -1px 0 {mood_data['contrast']},
+            -1px 1px 0 {mood_data['contrast']},
+            1px 1px 0 {mood_data['contrast']};
+    }}
+
+    .quote-icon {{
+        font-size: 3rem;
+        margin-bottom: 20px;
+        text-align: center;
+        color: {mood_data['gradient'][1]};
+        text-shadow: 
+            /* Outline for better contrast */
+            -1px -1px 0 {mood_data['contrast']},
+            1px -1px 0 {mood_data['contrast']},
+            -1px 1px 0 {mood_data['contrast']},
+            1px 1px 0 {mood_data['contrast']},
+            /* Original glow */
+            0 0 10px {mood_data['gradient'][0]}66;
+    }}
+    """
+
+
+# Custom CSS for the sidebar
+SIDEBAR_CSS = """
+    /* Style the entire sidebar */
+    .css-1d391kg {
+        background: linear-gradient(135deg, rgba(45, 45, 60, 0.9), rgba(30, 30, 40, 0.9)) !important;
+        backdrop-filter: blur(10px);
+        -webkit-backdrop-filter: blur(10px);
+    }
+
+    /* Style sidebar elements container */
+    .css-163ttbj {
+        background: transparent !important;
+    }
+    
+    /* Style the sidebar content */
+    .css-1d391kg > div {
+        background: transparent !important;
+    }
+"""
+
+# Custom CSS to ensure emojis stay visible
+EMOJI_BUTTON_CSS = """
+    /* Ensure emojis are visible in buttons */
+    .stButton button {
+        font-family: "Segoe UI Emoji", "Noto Color Emoji", "Apple Color Emoji", "Segoe UI Symbol", "Android Emoji", "EmojiSymbols" !important;
+        font-size: 1rem !important;
+    }
+    
+    /* Improve button appearance */
+    .stButton button {
+        min-height: 45px !important;
+        white-space: normal !important;
+        height: auto !important;
+        padding: 8px 16px !important;
+    }
+    
+    /* Make selected button more visible */
+    .stButton button[kind="primary"] {
+        border: 2px solid white !important;
+        font-weight: bold !important;
+    }
+"""
+
+
+def _read_background_css():
+    try:
+        with open(BACKGROUND_CSS_PATH, encoding="utf-8") as f:
+            return f.read()
+    except OSError as e:
+        print(f"Warning: Could not read {BACKGROUND_CSS_PATH}: {e}")
+        return ""
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace; @import rules are hoisted to the top as CSS requires"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = css.replace(";}", "}")
+    imports = re.findall(r"@import\s*(?:url\([^)]*\)|'[^']*'|\"[^\"]*\")[^;{]*;", css)
+    for rule in imports:
+        css = css.replace(rule, "")
+    return "".join(imports) + css.strip()
+
+
+@lru_cache(maxsize=None)
+def compile_stylesheet(mood):
+    """Minified stylesheet for one mood (cached per process)"""
+    mood_data = MOOD_MAPPING.get(mood, MOOD_MAPPING[DEFAULT_MOOD])
+    # Same cascade order the blocks used to appear in on the page
+    return minify_css("".join([
+        _read_background_css(),
+        _base_css(mood_data),
+        _mood_css(mood_data),
+        _quote_css(mood_data),
+        SIDEBAR_CSS,
+        EMOJI_BUTTON_CSS
+    ]))
+
+
+@lru_cache(maxsize=None)
+def compile_theme(mood):
+    """Complete HTML payload for a mood: stylesheet plus the ambient light and mood icon"""
+    mood_data = MOOD_MAPPING.get(mood, MOOD_MAPPING[DEFAULT_MOOD])
+    return (
+        f"<style>{compile_stylesheet(mood)}</style>"
+        f'<div class="ambient-light"></div>'
+        f'<div class="mood-icon icon-pulse">{mood_data["icon"]}</div>'
+    )
+
+
+def payload_size(mood):
+    """Bytes the theme adds to every rerun for this mood"""
+    return len(compile_theme(mood).encode("utf-8"))
+
+
+def precompile():
+    """Build every mood's theme up front so no rerun pays for it"""
+    for mood in MOOD_MAPPING:
+        compile_theme(mood)